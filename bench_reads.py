@@ -0,0 +1,72 @@
+# speed benchmark for the bulk patient file reads
+# makes a fake dataset and times readPatientFilesParallel() from
+# hospital_v4.py with parseDiseases (the Statistics scan) at a few worker and
+# chunk settings. workers=1 is the plain sequential loop to compare against,
+# chunk 1 is one pool task per file
+#
+# usage: python bench_reads.py [patients] [repeats]   (default 100000, 3)
+
+import ast
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+import loadtest
+
+appFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hospital_v4.py")
+settings = [(1, None), (4, 256), (16, 1), (16, 64), (16, 256), (16, 1024)]
+
+
+# the app runs top to bottom as a streamlit script, so it can't be imported.
+# take just the functions and classes a benchmark needs out of its source
+# instead. namespace gives them the modules and settings they use
+def loadFromApp(names, namespace):
+    with open(appFile, "r", encoding="utf-8") as file:
+        tree = ast.parse(file.read())
+    nodes = [n for n in tree.body if isinstance(n, (ast.FunctionDef, ast.ClassDef)) and n.name in names]
+    found = {n.name for n in nodes}
+    if found != set(names):
+        sys.exit(f"not found in hospital_v4.py: {', '.join(sorted(set(names) - found))}")
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), appFile, "exec"), namespace)
+    return namespace
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    app = loadFromApp(["ReadTimeoutError", "readPatientFilesParallel", "parseDiseases"], {
+        "time": time, "ThreadPoolExecutor": ThreadPoolExecutor, "as_completed": as_completed,
+        "FuturesTimeout": FuturesTimeout, "readWorkers": 16, "readTimeout": 600, "readChunkSize": 256,
+    })
+    parseDiseases = app["parseDiseases"]
+
+    random.seed(7)
+    dataDir = tempfile.mkdtemp(prefix="lifeline_bench_")
+    loadtest.makeDataset(dataDir, n)
+    patientIds = [name[:-4] for name in os.listdir(dataDir) if name.startswith("pat")]
+
+    # same work readPatientFile does for a hot file
+    def reader(pid):
+        with open(os.path.join(dataDir, f"{pid}.txt"), "r") as file:
+            return pid, parseDiseases(file.read())
+
+    print(f"patients: {len(patientIds)}, best of {repeats}")
+    print(f"{'workers':>8} {'chunk':>6} {'ms':>8}")
+    for workers, chunkSize in settings:
+        best = None
+        for _ in range(repeats):
+            startTime = time.perf_counter()
+            count = sum(1 for _ in app["readPatientFilesParallel"](patientIds, workers=workers, reader=reader,
+                                                                  chunkSize=chunkSize or len(patientIds)))
+            elapsed = time.perf_counter() - startTime
+            best = elapsed if best is None else min(best, elapsed)
+        if count != len(patientIds):
+            sys.exit(f"read {count} of {len(patientIds)} files")
+        print(f"{workers:>8} {chunkSize or '-':>6} {best * 1000:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
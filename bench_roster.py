@@ -0,0 +1,117 @@
+# memory benchmark for the columnar patient roster
+# makes a fake Users.txt and builds the old list-of-lists (readFromFile) and
+# the columnar roster from it, each in a fresh python process, so the memory
+# one of them leaves behind can't show up in the other's numbers. then opens
+# the Statistics page headless to time a rerun
+#
+# usage: python bench_roster.py [patients]   (default 100000)
+
+import gc
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from bench_reads import loadFromApp
+
+appFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hospital_v4.py")
+names = ["Raj", "Rajesh", "Anita", "Sunil", "Priya", "Amit", "Kiran", "Meena", "Arjun", "Neha"]
+
+
+# write a Users.txt with n patients in the normal format
+def makeUsersFile(fileName, n):
+    with open(fileName, "w") as file:
+        for i in range(n):
+            name = random.choice(names)
+            age = random.randint(1, 100)
+            contact = random.randint(6000000000, 9999999999)
+            file.write(f"pat{name[:3].lower()}{age}{i},{name}@{age},{age},{name},{contact}\n")
+
+
+# peak resident memory of this process in MB
+def peakRss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+
+# resident memory of this process right now in MB. only linux has
+# /proc/self/statm, elsewhere the peak is the best there is
+def currentRss():
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peakRss()
+
+
+# runs in its own process: build one representation of fileName and print
+# how much resident memory it took, at its peak and once built, as json
+def measure(kind, fileName):
+    app = loadFromApp(["readFromFile", "iterRecords", "encodeValue", "PatientRow", "PatientRoster"],
+                      {"np": np, "array": array, "os": os, "sys": sys})
+    gc.collect()
+    before = currentRss()
+    startTime = time.perf_counter()
+    if kind == "lists":
+        data = app["readFromFile"](fileName)
+    else:
+        data = app["PatientRoster"](app["iterRecords"](fileName))
+    buildTime = time.perf_counter() - startTime
+    gc.collect()
+    print(json.dumps({
+        "rows": len(data),
+        "held": currentRss() - before,
+        "peak": peakRss() - before,
+        "ms": buildTime * 1000,
+    }))
+
+
+def measureInSubprocess(kind, fileName):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", kind, fileName],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(7)
+    os.chdir(tempfile.mkdtemp(prefix="lifeline_bench_"))
+    makeUsersFile("Users.txt", n)
+    perHundredK = 100000 / n
+
+    print(f"patients: {n}  (RSS growth over a fresh process, MB)")
+    print(f"{'':18} {'held':>8} {'peak':>8} {'per 100k':>9} {'build ms':>9}")
+    results = {}
+    for kind, label in [("lists", "list of lists"), ("roster", "columnar roster")]:
+        r = results[kind] = measureInSubprocess(kind, os.path.abspath("Users.txt"))
+        print(f"{label:18} {r['held']:8.1f} {r['peak']:8.1f} {r['held'] * perHundredK:9.1f} {r['ms']:9.0f}")
+    print(f"saving: {results['lists']['held'] / max(results['roster']['held'], 0.1):.1f}x held, "
+          f"{results['lists']['peak'] / max(results['roster']['peak'], 0.1):.1f}x peak")
+
+    at = AppTest.from_file(appFile, default_timeout=600)
+    at.session_state["logged"] = True
+    at.session_state["role"] = "Admin"
+    at.session_state["user"] = "admin"
+    at.run()
+    startTime = time.perf_counter()
+    at.sidebar.selectbox[0].set_value("Statistics").run()
+    pageTime = time.perf_counter() - startTime
+    if at.exception:
+        print("Statistics page failed:", at.exception[0].message)
+        sys.exit(1)
+    print(f"statistics page rerun: {pageTime * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
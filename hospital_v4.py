@@ -1,7 +1,25 @@
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import gzip
+import io
+import json
 import os
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+try:
+    import fcntl
+except ImportError:
+    import msvcrt
+    fcntl = None
 
 # setup the page layout
 st.set_page_config(page_title="Lifeline", page_icon="🏥", layout="centered")
@@ -46,18 +64,104 @@ if "role" not in st.session_state:
 if "user" not in st.session_state:
     st.session_state["user"] = ""
 
+# hospital branches. branches.txt lists one branch name per line and each
+# branch keeps all of its files in branches/<name>/. without branches.txt
+# everything stays in the current folder like before
+branchesFile = "branches.txt"
+branchRoot = "branches"
+branches = []
+if os.path.exists(branchesFile):
+    with open(branchesFile, "r") as file:
+        branches = [line.strip() for line in file if line.strip()]
+if "branch" not in st.session_state or st.session_state["branch"] not in (branches or [""]):
+    st.session_state["branch"] = branches[0] if branches else ""
+
+# folder holding a branch's files
+def branchDir(branch):
+    return os.path.join(branchRoot, branch) if branch else ""
+
+# run func(branch) for every branch at the same time, gives {branch: result}
+def runOnBranches(branchNames, func):
+    if not branchNames:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(branchNames)) as pool:
+        return dict(zip(branchNames, pool.map(func, branchNames)))
+
+# every file below is inside the current branch's folder
+dataDir = branchDir(st.session_state["branch"])
+if dataDir:
+    os.makedirs(dataDir, exist_ok=True)
+
 # hardcoded file names and admin credentials
-usersFile = "Users.txt"
-doctorsFile = "Doctors.txt"
+usersFile = os.path.join(dataDir, "Users.txt")
+doctorsFile = os.path.join(dataDir, "Doctors.txt")
 adminUsername = "admin"
 adminPassword = "admin123"
 
+# path of a patient's own log file
+def patientFile(patientId, folder=None):
+    return os.path.join(dataDir if folder is None else folder, f"{patientId}.txt")
+
+# folder for precomputed analytics
+snapshotDir = os.path.join(dataDir, "snapshots")
+dailySnapshotFile = os.path.join(snapshotDir, "daily.npz")
+duesCheckpointFile = os.path.join(snapshotDir, "dues_checkpoint.json")
+
+# runtime state (beds, OPD queue) snapshot and write-ahead journal
+stateDir = os.path.join(dataDir, "state")
+snapshotEveryOps = 100
+snapshotEverySeconds = 60
+
+# ids are unique across all branches, so their counter and the id -> branch
+# routes are kept once, outside the branch folders
+rootStateDir = "state"
+idSequenceFile = os.path.join(rootStateDir, "id_sequence.json")
+routesFile = os.path.join(rootStateDir, "routes.txt")
+
+# every file change is also written to the change log, which replica.py
+# copies into a standby folder. standbyDir is where the admin page looks
+# for the standby's progress
+changeLogFile = os.path.join(rootStateDir, "changelog.log")
+changeLogLockFile = os.path.join(rootStateDir, "changelog.lock")
+standbyDir = "standby"
+standbyStatusFile = os.path.join(standbyDir, ".replica_state.json")
+
+# compressed archive for old discharged patients
+archiveSegmentBytes = 16 * 1024 * 1024
+archiveAfterDays = 30
+
+# how often the live dashboards check for new events (seconds)
+liveRefreshSeconds = 2
+
+# settings for reading many patient files at once
+readWorkers = 16
+readTimeout = 30
+readChunkSize = 256  # files handed to a worker thread at a time
+
 class LoginError(Exception):
     pass
 
 class ValidationError(Exception):
     pass
 
+class ReadTimeoutError(Exception):
+    pass
+
+# exclusive lock on an open file, shared with other processes on this machine
+def lockFile(file):
+    if fcntl:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+
+def unlockFile(file):
+    if fcntl:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
 # read the file and split by comma. if file crashes, just return empty list
 def readFromFile(fileName):
     data = []
@@ -69,10 +173,802 @@ def readFromFile(fileName):
         pass
     return data
 
+# in-process event bus shared by every session on this server
+# the write path publishes to it and live dashboards ask for what is new
+class EventBus:
+    def __init__(self, size=2000):
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.events = deque(maxlen=size)
+
+    def publish(self, topic, key=None, payload=None):
+        with self.lock:
+            self.seq += 1
+            self.events.append((self.seq, topic, key, payload))
+
+    # events on a topic after seq. complete is False when some were already dropped
+    def since(self, seq, topic):
+        with self.lock:
+            complete = not self.events or self.events[0][0] <= seq + 1
+            found = [e for e in self.events if e[0] > seq and e[1] == topic]
+            return self.seq, found, complete
+
+# one per branch, keyed by the branch folder
+@st.cache_resource
+def getEventBus(folder):
+    return EventBus()
+
+# beds and OPD queue shared by every session. each change is written to the
+# journal (and fsynced) before it is applied, and every so often the whole
+# state is saved to a snapshot and the journal starts over. on restart the
+# snapshot is loaded and only the journal written after it is replayed
+# every server process has its own copy, so all of this happens under the
+# change log's file lock, and each process first catches up with what the
+# others wrote. the seq always comes from the files, never just from memory
+class HospitalState:
+    def __init__(self, folder):
+        self.snapshotFile = os.path.join(folder, "runtime.json")
+        self.journalFile = os.path.join(folder, "journal.log")
+        self.lock = threading.RLock()
+        self.beds = {"B1": "FREE", "B2": "FREE", "B3": "FREE", "B4": "FREE", "B5": "FREE"}
+        self.opdQueue = []
+        self.seq = 0
+        self.snapshotSeq = 0
+        self.journalOffset = 0
+        self.pending = 0
+        self.lastSnapshot = time.time()
+        os.makedirs(folder, exist_ok=True)
+        self.journal = open(self.journalFile, "ab")
+        self.refresh()
+
+    # hold the state for this thread and every other process, caught up with
+    # the files first. can be nested
+    @contextmanager
+    def locked(self):
+        with getChangeLog().locked(), self.lock:
+            self.sync()
+            yield
+
+    # catch up with other processes without changing anything
+    def refresh(self):
+        with self.locked():
+            pass
+
+    # only called with the lock held. a snapshot with a seq this process
+    # hasn't seen means the journal was started over, so the snapshot is
+    # loaded (if it is newer) and the journal read from the start. a torn
+    # last line from a crash is cut off, otherwise the next entry is glued
+    # onto it and everything after it is lost on the following restart
+    def sync(self):
+        try:
+            with open(self.snapshotFile, "r") as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            saved = {"seq": 0}
+        if saved["seq"] != self.snapshotSeq:
+            if saved["seq"] > self.seq:
+                self.beds.update(saved["beds"])
+                self.opdQueue[:] = saved["opdQueue"]
+                self.seq = saved["seq"]
+            self.snapshotSeq = saved["seq"]
+            self.journalOffset = 0
+            self.pending = 0
+        try:
+            with open(self.journalFile, "r+b") as file:
+                file.seek(self.journalOffset)
+                for line in file:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if entry["seq"] > self.seq:
+                        self.apply(entry)
+                        self.seq = entry["seq"]
+                    self.pending += 1
+                    self.journalOffset += len(line)
+                file.truncate(self.journalOffset)
+        except OSError:
+            pass
+
+    def apply(self, entry):
+        if entry["op"] == "bed":
+            self.beds[entry["bed"]] = entry["value"]
+        elif entry["op"] == "opdAdd":
+            self.opdQueue.append(entry["pid"])
+        elif entry["op"] == "opdPop" and self.opdQueue:
+            return self.opdQueue.pop(0)
+
+    # journal one change then apply it. returns what apply returned
+    def record(self, op, **args):
+        with self.locked():
+            self.seq += 1
+            entry = dict(args, seq=self.seq, op=op)
+            line = (json.dumps(entry) + "\n").encode()
+            self.journal.write(line)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.journalOffset += len(line)
+            result = self.apply(entry)
+            self.pending += 1
+            if self.pending >= snapshotEveryOps or time.time() - self.lastSnapshot >= snapshotEverySeconds:
+                self.snapshot()
+            return result
+
+    def snapshot(self):
+        with self.locked():
+            tempFile = self.snapshotFile + ".tmp"
+            with open(tempFile, "w") as file:
+                json.dump({"seq": self.seq, "beds": self.beds, "opdQueue": self.opdQueue}, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tempFile, self.snapshotFile)
+            # entries up to seq are in the snapshot now, and every process
+            # has caught up before writing, so the journal can start over
+            self.journal.truncate(0)
+            self.snapshotSeq = self.seq
+            self.journalOffset = 0
+            self.pending = 0
+            self.lastSnapshot = time.time()
+
+# one per branch, keyed by its state folder
+@st.cache_resource
+def getHospitalState(folder):
+    return HospitalState(folder)
+
+# hands out patient and doctor ids. the ids already in Users.txt/Doctors.txt
+# are kept in a set so checking a new one is O(1) instead of a file scan.
+# the old name+age id is used when it is free, otherwise a suffix from a
+# persisted counter is added, so registering never fails on a clash
+class IdAllocator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.known = {}
+        self.stamps = {}
+        self.loadSequence()
+
+    # counters as saved, including what other server processes handed out
+    def loadSequence(self):
+        try:
+            with open(idSequenceFile, "r") as file:
+                self.sequence = json.load(file)
+        except (OSError, ValueError):
+            self.sequence = {}
+
+    # ids in a master file, re-read only if someone else changed the file
+    def idsIn(self, fileName):
+        stamp = fileStamp(fileName)
+        if fileName not in self.known or self.stamps.get(fileName) != stamp:
+            ids = set()
+            try:
+                with open(fileName, "r") as file:
+                    for line in file:
+                        ids.add(line.split(",", 1)[0].strip())
+            except OSError:
+                pass
+            self.known[fileName] = ids
+            self.stamps[fileName] = stamp
+        return self.known[fileName]
+
+    def nextSequence(self, prefix):
+        self.sequence[prefix] = self.sequence.get(prefix, 0) + 1
+        os.makedirs(rootStateDir, exist_ok=True)
+        tempFile = idSequenceFile + ".tmp"
+        with open(tempFile, "w") as file:
+            json.dump(self.sequence, file)
+        os.replace(tempFile, idSequenceFile)
+        return self.sequence[prefix]
+
+    # append the new record under the lock so the id can't be taken twice
+    # the router also has to agree, so the id is free in every branch
+    # the lock is the change log's file lock, so other server processes wait
+    # too, and the counters, routes and master file are re-read inside it
+    def register(self, fileName, baseId, prefix, makeLine, router, branch):
+        with getChangeLog().locked(), self.lock:
+            self.loadSequence()
+            router.refresh()
+            ids = self.idsIn(fileName)
+            newId = baseId
+            while newId in ids or router.known(newId):
+                newId = f"{baseId}_{self.nextSequence(prefix)}"
+            writeToFile(fileName, makeLine(newId))
+            ids.add(newId)
+            self.stamps[fileName] = fileStamp(fileName)
+            router.add(newId, branch)
+            return newId
+
+@st.cache_resource
+def getIdAllocator():
+    return IdAllocator()
+
+# remembers which branch every patient/doctor id belongs to, so a login or
+# lookup goes straight to that branch's files. routes.txt is append only with
+# one "id,branch" line per id. an id it has never seen is searched for in
+# every branch at once and then remembered
+class BranchRouter:
+    def __init__(self, branchNames):
+        self.branches = list(branchNames)
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.routesOffset = 0
+        if not self.branches:
+            return
+        if os.path.exists(routesFile):
+            self.refresh()
+        else:
+            self.rebuild()
+
+    # read the lines added to routes.txt since last time, e.g. by another
+    # server process. a shorter file was rebuilt, so it is read again in full
+    def refresh(self):
+        if not self.branches:
+            return
+        with self.lock:
+            try:
+                with open(routesFile, "rb") as file:
+                    if os.fstat(file.fileno()).st_size < self.routesOffset:
+                        self.routes = {}
+                        self.routesOffset = 0
+                    file.seek(self.routesOffset)
+                    for line in file:
+                        if not line.endswith(b"\n"):
+                            break
+                        p = line.decode().strip().split(",")
+                        if len(p) > 1:
+                            self.routes[p[0]] = p[1]
+                        self.routesOffset += len(line)
+            except OSError:
+                pass
+
+    # build routes.txt from scratch out of every branch's master files
+    def rebuild(self):
+        def idsIn(branch):
+            ids = []
+            for name in ["Users.txt", "Doctors.txt"]:
+                ids += [p[0] for p in iterRecords(os.path.join(branchDir(branch), name), fields=(0,))]
+            return ids
+        with self.lock:
+            self.routes = {}
+            for branch, ids in runOnBranches(self.branches, idsIn).items():
+                for pid in ids:
+                    self.routes[pid] = branch
+            os.makedirs(rootStateDir, exist_ok=True)
+            with open(routesFile, "w") as file:
+                for pid, branch in self.routes.items():
+                    file.write(f"{pid},{branch}\n")
+            self.routesOffset = os.path.getsize(routesFile)
+
+    def known(self, anyId):
+        return anyId in self.routes
+
+    # branch of an id. "" when there are no branches, None if no branch has it
+    def lookup(self, anyId):
+        if not self.branches:
+            return ""
+        branch = self.routes.get(anyId)
+        if branch is None:
+            def hasId(branch):
+                return any(findRecord(os.path.join(branchDir(branch), name), {0: anyId}, fields=(0,))
+                           for name in ["Users.txt", "Doctors.txt"])
+            for found, has in runOnBranches(self.branches, hasId).items():
+                if has:
+                    self.add(anyId, found)
+                    return found
+        return branch
+
+    def add(self, anyId, branch):
+        if not self.branches:
+            return
+        with self.lock:
+            self.routes[anyId] = branch
+            os.makedirs(rootStateDir, exist_ok=True)
+            with open(routesFile, "a") as file:
+                file.write(f"{anyId},{branch}\n")
+
+@st.cache_resource
+def getBranchRouter(branchNames):
+    return BranchRouter(branchNames)
+
+# rewrite a comma separated file with the row whose first column is key
+# swapped for newRow
+def replaceRow(fileName, key, newRow):
+    with open(fileName, "r") as file:
+        rows = [newRow if row.split(",", 1)[0].strip() == key else row for row in file]
+    with open(fileName + ".tmp", "w") as file:
+        file.writelines(rows)
+    os.replace(fileName + ".tmp", fileName)
+
+# numbered log of every change made through writeToFile/replaceFile/updateRow.
+# each entry is one JSON line with the file path, the text appended (the
+# whole new file for "replace", the new row and its key for "row") and a
+# crc32 of that text. the entry is
+# fsynced before the file itself is touched, and both happen under one lock
+# so the log order is the order the files really changed in. the lock is a
+# file lock too, since every server process appends to the same log, and
+# the next number always comes from the log itself
+class ChangeLog:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.seq = 0
+        self.lastTime = 0
+        self.size = None
+        os.makedirs(rootStateDir, exist_ok=True)
+        self.lockFile = open(changeLogLockFile, "ab")
+        self.file = open(changeLogFile, "ab+")
+        with self.locked():
+            self.syncTail()
+
+    # hold the log for this thread and process. can be nested
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            if self.depth == 0:
+                lockFile(self.lockFile)
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    unlockFile(self.lockFile)
+
+    # newest seq and time in the log, including other processes' entries
+    def head(self):
+        with self.locked():
+            if os.fstat(self.file.fileno()).st_size != self.size:
+                self.syncTail()
+            return self.seq, self.lastTime
+
+    # pick up the numbering from the last whole entry, reading backwards in
+    # growing chunks since "replace" entries can be large. whatever comes
+    # after that entry is a torn line from a crash and is cut off, so the
+    # next entry doesn't get glued onto it
+    def syncTail(self):
+        size = self.file.seek(0, os.SEEK_END)
+        chunk = 64 * 1024
+        while True:
+            start = max(size - chunk, 0)
+            self.file.seek(start)
+            lines = self.file.read().split(b"\n")
+            end = size - len(lines.pop())
+            if start > 0:
+                lines = lines[1:]  # first line is probably cut off
+            for line in reversed(lines):
+                try:
+                    last = json.loads(line)
+                except ValueError:
+                    end -= len(line) + 1
+                    continue
+                self.seq = last["seq"]
+                self.lastTime = last["time"]
+                break
+            else:
+                if start > 0:
+                    chunk *= 2
+                    continue
+            self.file.truncate(end)
+            self.size = end
+            return
+
+    def write(self, op, fileName, data, key=None):
+        with self.locked():
+            # another process wrote since our last entry, so renumber from the file
+            if os.fstat(self.file.fileno()).st_size != self.size:
+                self.syncTail()
+            self.seq += 1
+            self.lastTime = time.time()
+            entry = {"seq": self.seq, "time": self.lastTime, "op": op, "path": fileName,
+                     "data": data, "crc": zlib.crc32(data.encode())}
+            if key is not None:
+                entry["key"] = key
+            self.file.write((json.dumps(entry) + "\n").encode())
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.size = os.fstat(self.file.fileno()).st_size
+            if op == "append":
+                with open(fileName, "a") as file:
+                    file.write(data)
+            elif op == "row":
+                replaceRow(fileName, key, data)
+            else:
+                with open(fileName + ".tmp", "w") as file:
+                    file.write(data)
+                os.replace(fileName + ".tmp", fileName)
+
+    # (offset, time, path) of every whole entry from byte offset start on,
+    # plus the offset just after the last one. it reads through its own file
+    # handle, so it needs no lock and doesn't move the append position
+    def entriesFrom(self, start):
+        entries = []
+        offset = start
+        with open(changeLogFile, "rb") as file:
+            file.seek(start)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                entries.append((offset, entry["time"], entry["path"]))
+                offset += len(line)
+        return entries, offset
+
+@st.cache_resource
+def getChangeLog():
+    return ChangeLog()
+
+# patient files of settled, discharged patients are moved out of the working
+# folder into gzip segment files. each record is its own gzip member, and
+# index.json maps patient id -> [segment, offset, length] so one record can
+# be read back without touching the rest of the segment, plus the time the
+# record last changed before it was archived
+class ArchiveStore:
+    def __init__(self, folder):
+        self.folder = folder
+        self.archiveDir = os.path.join(folder, "archive")
+        self.indexFile = os.path.join(self.archiveDir, "index.json")
+        self.lock = threading.Lock()
+        try:
+            with open(self.indexFile, "r") as file:
+                self.index = json.load(file)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def has(self, patientId):
+        return patientId in self.index
+
+    def read(self, patientId):
+        entry = self.index.get(patientId)
+        if not entry:
+            return None
+        segment, offset, length = entry[:3]
+        with open(os.path.join(self.archiveDir, segment), "rb") as file:
+            file.seek(offset)
+            return gzip.decompress(file.read(length)).decode()
+
+    # time the record last changed before it was archived
+    def mtime(self, patientId):
+        entry = self.index.get(patientId)
+        return entry[3] if entry else None
+
+    def saveIndex(self):
+        tempFile = self.indexFile + ".tmp"
+        with open(tempFile, "w") as file:
+            json.dump(self.index, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tempFile, self.indexFile)
+
+    # current segment to append to, a new one once it gets too big
+    def currentSegment(self):
+        segments = sorted(f for f in os.listdir(self.archiveDir) if f.startswith("segment-"))
+        if segments and os.path.getsize(os.path.join(self.archiveDir, segments[-1])) < archiveSegmentBytes:
+            return segments[-1]
+        return f"segment-{len(segments) + 1:04d}.gz"
+
+    # compress these patients' files into the archive, then remove the hot
+    # copies. all the records are appended and fsynced once, then the index
+    # is saved once, and only then are the hot files deleted. it runs under
+    # the change log lock, like writeToFile(), so no write can land between
+    # reading a hot file and deleting it. returns how many were moved
+    def archive(self, patientIds):
+        with getChangeLog().locked(), self.lock:
+            os.makedirs(self.archiveDir, exist_ok=True)
+            segment = self.currentSegment()
+            entries = {}
+            file = open(os.path.join(self.archiveDir, segment), "ab")
+            try:
+                for pid in patientIds:
+                    try:
+                        with open(patientFile(pid, self.folder), "rb") as hot:
+                            mtime = os.fstat(hot.fileno()).st_mtime
+                            data = gzip.compress(hot.read())
+                    except OSError:
+                        continue
+                    # a full segment is synced and the next one started
+                    if file.tell() >= archiveSegmentBytes:
+                        file.flush()
+                        os.fsync(file.fileno())
+                        file.close()
+                        segment = f"segment-{int(segment[8:-3]) + 1:04d}.gz"
+                        file = open(os.path.join(self.archiveDir, segment), "ab")
+                    entries[pid] = [segment, file.tell(), len(data), mtime]
+                    file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                file.close()
+            if not entries:
+                return 0
+            self.index.update(entries)
+            self.saveIndex()
+            for pid in entries:
+                os.remove(patientFile(pid, self.folder))
+            return len(entries)
+
+    # put an archived record back in the working folder before it is changed
+    def restore(self, patientId):
+        with self.lock:
+            if patientId not in self.index:
+                return
+            text = self.read(patientId)
+            if not os.path.exists(patientFile(patientId, self.folder)):
+                with open(patientFile(patientId, self.folder), "w") as file:
+                    file.write(text)
+            del self.index[patientId]
+            self.saveIndex()
+
+# one per branch, keyed by the branch folder
+@st.cache_resource
+def getArchiveStore(folder):
+    return ArchiveStore(folder)
+
+# patient file from the working folder, or from the archive if it was moved
+def openPatientFile(patientId):
+    if os.path.exists(patientFile(patientId)):
+        return open(patientFile(patientId), "r")
+    text = getArchiveStore(dataDir).read(patientId)
+    if text is None:
+        raise FileNotFoundError(patientFile(patientId))
+    return io.StringIO(text)
+
+# go through the "--- SOMETHING ---" blocks of a patient log one at a time
+# yields (header, lines) e.g. ("APPOINTMENT BOOKED", ["Diseases: Fever", ...])
+# a block ends at a blank line or the next header
+# headers: only give back these, limit: stop after this many blocks
+def iterEvents(patientId, headers=None, limit=None):
+    found = 0
+    header = None
+    lines = []
+    with openPatientFile(patientId) as file:
+        for line in file:
+            line = line.strip()
+            isHeader = line.startswith("---") and line.endswith("---") and line.strip("- ")
+            if header and (isHeader or not line):
+                if headers is None or header in headers:
+                    yield header, lines
+                    found += 1
+                    if limit and found >= limit:
+                        return
+                header = None
+            if isHeader:
+                header = line.strip("- ")
+                lines = []
+            elif header:
+                lines.append(line)
+        if header and (headers is None or header in headers):
+            yield header, lines
+
+def patientFileExists(patientId):
+    return os.path.exists(patientFile(patientId)) or getArchiveStore(dataDir).has(patientId)
+
 # append a new line to the file
 def writeToFile(fileName, dataLine):
-    with open(fileName, "a") as file:
-        file.write(dataLine + "\n")
+    # everything is looked up from the file's own folder (its branch)
+    folder, name = os.path.split(fileName)
+    changeLog = getChangeLog()
+    with changeLog.locked():
+        # an archived patient is coming back, bring their record back first
+        if name.endswith(".txt") and getArchiveStore(folder).has(name[:-4]):
+            getArchiveStore(folder).restore(name[:-4])
+        changeLog.write("append", fileName, dataLine + "\n")
+    getEventBus(folder).publish("files", fileName)
+
+# overwrite a whole file (profile updates), also through the change log
+def replaceFile(fileName, contents):
+    getChangeLog().write("replace", fileName, contents)
+    getEventBus(os.path.dirname(fileName)).publish("files", fileName)
+
+# change one row of a master file, keyed by its first column. only the new
+# row goes into the change log, not the whole file
+def updateRow(fileName, key, row):
+    getChangeLog().write("row", fileName, row + "\n", key=key)
+    getEventBus(os.path.dirname(fileName)).publish("files", fileName)
+
+# go through a comma separated file one line at a time without keeping it
+# where:  {column: value} or {column: function} a row has to match
+# fields: tuple of columns to give back, None gives the whole row
+# limit:  stop reading after this many matches
+# only the columns up to the last one asked for are split
+def iterRecords(fileName, where=None, fields=None, limit=None):
+    where = where or {}
+    needed = list(where) + list(fields or [])
+    maxsplit = max(needed) + 1 if needed and fields is not None else -1
+    found = 0
+    try:
+        with open(fileName, "r") as file:
+            for line in file:
+                p = line.strip().split(",", maxsplit)
+                matched = True
+                for column, want in where.items():
+                    if column >= len(p) or not (want(p[column]) if callable(want) else p[column] == want):
+                        matched = False
+                        break
+                if not matched:
+                    continue
+                if fields is not None:
+                    if max(fields, default=-1) >= len(p):
+                        continue
+                    yield tuple(p[i] for i in fields)
+                else:
+                    yield p
+                found += 1
+                if limit and found >= limit:
+                    return
+    except OSError:
+        return
+
+# first matching row or None
+def findRecord(fileName, where, fields=None):
+    return next(iterRecords(fileName, where, fields, limit=1), None)
+
+# small int code of a text value, a new one the first time it is seen
+# categories keeps the distinct values in code order
+def encodeValue(value, lookup, categories):
+    code = lookup.get(value)
+    if code is None:
+        code = len(categories)
+        lookup[value] = code
+        categories.append(value)
+    return code
+
+# light view of one roster row. only keeps the roster and the row number
+class PatientRow:
+    __slots__ = ("roster", "index")
+
+    def __init__(self, roster, index):
+        self.roster = roster
+        self.index = index
+
+    @property
+    def pid(self):
+        return self.roster.ids[self.index].decode()
+
+    @property
+    def password(self):
+        return self.roster.passwords[self.roster.passwordCodes[self.index]]
+
+    @property
+    def name(self):
+        return self.roster.names[self.roster.nameCodes[self.index]]
+
+    @property
+    def age(self):
+        return int(self.roster.ages[self.index])
+
+    @property
+    def contact(self):
+        number = int(self.roster.contacts[self.index])
+        return str(number).zfill(10) if number >= 0 else "N/A"
+
+# Users.txt kept as columns instead of one list of strings per patient
+# ids are packed bytes, names/passwords are codes, age and contact are numpy ints
+# a missing or broken age/contact is stored as -1
+# rows can be any iterable of split rows, e.g. iterRecords(). each row goes
+# straight into the columns, so the file is never held as lists of strings
+class PatientRoster:
+    __slots__ = ("ids", "passwordCodes", "passwords", "nameCodes", "names", "ages", "contacts", "stamp")
+
+    def __init__(self, rows, stamp=None):
+        ids = []
+        passwordCodes, nameCodes, ages, contacts = array("i"), array("i"), array("h"), array("q")
+        self.passwords, self.names = [], []
+        passwordLookup, nameLookup = {}, {}
+        for r in rows:
+            if len(r) == 0 or not r[0]:
+                continue
+            ids.append(r[0].encode())
+            passwordCodes.append(encodeValue(r[1] if len(r) > 1 else "", passwordLookup, self.passwords))
+            nameCodes.append(encodeValue(r[3] if len(r) > 3 else "", nameLookup, self.names))
+            ages.append(int(r[2]) if len(r) > 2 and r[2].isdigit() else -1)
+            contacts.append(int(r[4]) if len(r) > 4 and r[4].isdigit() else -1)
+        self.ids = np.array(ids, dtype=bytes)
+        self.passwordCodes = np.array(passwordCodes, dtype=np.int32)
+        self.nameCodes = np.array(nameCodes, dtype=np.int32)
+        self.ages = np.array(ages, dtype=np.int16)
+        self.contacts = np.array(contacts, dtype=np.int64)
+        self.stamp = stamp
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return PatientRow(self, index)
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield PatientRow(self, i)
+
+    def patientIds(self):
+        return [pid.decode() for pid in self.ids]
+
+    def validAges(self):
+        return self.ages[self.ages >= 0]
+
+    # row for this id or None
+    def find(self, patientId):
+        matches = np.flatnonzero(self.ids == patientId.encode())
+        return PatientRow(self, int(matches[0])) if len(matches) else None
+
+    # rows ordered by age, youngest first
+    def sortedByAge(self):
+        return [PatientRow(self, int(i)) for i in np.argsort(self.ages, kind="stable")]
+
+    # bytes used by the arrays and the distinct strings
+    def memoryUsage(self):
+        arrays = self.ids.nbytes + self.passwordCodes.nbytes + self.nameCodes.nbytes + self.ages.nbytes + self.contacts.nbytes
+        strings = sum(sys.getsizeof(v) for v in self.passwords) + sum(sys.getsizeof(v) for v in self.names)
+        return arrays + strings
+
+# modified time and size, used to notice a file changed on disk
+def fileStamp(fileName):
+    try:
+        info = os.stat(fileName)
+        return (info.st_mtime_ns, info.st_size)
+    except OSError:
+        return None
+
+# one roster per version of a Users.txt, shared by every session. a change on
+# disk gives a new stamp and so a new roster, old versions fall out of the cache
+@st.cache_resource(max_entries=max(len(branches), 1) * 2)
+def buildRoster(fileName, stamp):
+    return PatientRoster(iterRecords(fileName), (fileName, stamp))
+
+# build the roster once and reuse it until Users.txt changes on disk
+def loadRoster(fileName=usersFile):
+    return buildRoster(fileName, fileStamp(fileName))
+
+# read one patient file (or its archived copy) and run the parser on its text
+# missing file gives None
+def readPatientFile(patientId, parser=None):
+    try:
+        with openPatientFile(patientId) as file:
+            text = file.read()
+    except:
+        return patientId, None
+    if parser:
+        return patientId, parser(text)
+    return patientId, text
+
+# read a lot of patient files together on a small thread pool
+# yields (patientId, result) in whatever order they finish
+# raises ReadTimeoutError if the whole batch takes longer than timeout seconds,
+# so a caller never mistakes what it got so far for every file
+# reader(patientId) gives back (patientId, result). the default reads the
+# file and runs parser on it, anything else it needs goes in through a closure
+# each worker gets chunkSize ids at a time, one task per file costs more in
+# pool overhead than the read itself. workers=1 (or a single chunk) reads
+# them one by one on this thread
+def readPatientFilesParallel(patientIds, parser=None, workers=readWorkers, timeout=readTimeout, reader=None,
+                             chunkSize=readChunkSize):
+    reader = reader or (lambda pid: readPatientFile(pid, parser))
+    patientIds = list(patientIds)
+    chunks = [patientIds[i:i + chunkSize] for i in range(0, len(patientIds), chunkSize)]
+    done = 0
+    if workers <= 1 or len(chunks) <= 1:
+        deadline = time.perf_counter() + timeout
+        for pid in patientIds:
+            if time.perf_counter() > deadline:
+                raise ReadTimeoutError(f"only {done} of {len(patientIds)} patient files were read in {timeout} s")
+            yield reader(pid)
+            done += 1
+        return
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(chunks)))
+    try:
+        futures = [pool.submit(lambda chunk: [reader(pid) for pid in chunk], chunk) for chunk in chunks]
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                for result in future.result():
+                    yield result
+                    done += 1
+        except FuturesTimeout:
+            raise ReadTimeoutError(f"only {done} of {len(patientIds)} patient files were read in {timeout} s")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# same thing but collected into a dict so pages can keep the Users.txt order
+def readPatientFilesMap(patientIds, parser=None):
+    return dict(readPatientFilesParallel(patientIds, parser))
 
 # sidebar login ui
 st.title("🏥 LifeLine – Smart Hospital System")
@@ -85,30 +981,30 @@ if not st.session_state["logged"]:
     
     if st.sidebar.button("Login"):
         role = None
+        loginBranch = st.session_state["branch"]
         
         # check admin
         if usernameInput == adminUsername and passwordInput == adminPassword:
             role = "Admin"
         
-        # check patient login against users file
+        # check patient login against the users file of their branch
         elif usernameInput.startswith("pat"):
-            patients = readFromFile(usersFile)
-            for p in patients:
-                # format: id, password, age...
-                if len(p) > 1 and p[1] == passwordInput and p[0] == usernameInput:
-                    role = "Patient"
-                    break
+            loginBranch = getBranchRouter(tuple(branches)).lookup(usernameInput)
+            # format: id, password, age...
+            if loginBranch is not None and findRecord(os.path.join(branchDir(loginBranch), "Users.txt"),
+                                                      {0: usernameInput, 1: passwordInput}, fields=(0,)):
+                role = "Patient"
         
-        # check doctor login against doctors file
+        # check doctor login against the doctors file of their branch
         elif usernameInput.startswith("doc") and usernameInput == passwordInput:
-             doctors = readFromFile(doctorsFile)
-             for d in doctors:
-                 if len(d) > 0 and d[0] == usernameInput:
-                     role = "Doctor"
-                     break
+            loginBranch = getBranchRouter(tuple(branches)).lookup(usernameInput)
+            if loginBranch is not None and findRecord(os.path.join(branchDir(loginBranch), "Doctors.txt"),
+                                                      {0: usernameInput}, fields=(0,)):
+                role = "Doctor"
         
         # if role found, save state and reload
         if role:
+            st.session_state["branch"] = loginBranch
             st.session_state["logged"] = True
             st.session_state["role"] = role
             st.session_state["user"] = usernameInput
@@ -125,6 +1021,12 @@ if not st.session_state["logged"]:
 # logic for when user is logged in
 else:
     st.sidebar.info(f"👤 Logged in as: **{st.session_state['user']}**")
+
+    # admins can switch branch, everyone else stays in their own
+    if branches and st.session_state["role"] == "Admin":
+        st.sidebar.selectbox("🏥 Branch", branches, key="branch")
+    elif branches:
+        st.sidebar.caption(f"🏥 Branch: {st.session_state['branch']}")
     
     # logout button clears state
     if st.sidebar.button("Logout"):
@@ -152,7 +1054,10 @@ if role == "Admin":
             "Bed Allocation",
             "Add Doctor",
             "Statistics",
-        ],
+            "Dues Report",
+            "Archive Records",
+            "Replication",
+        ] + (["Branch Overview"] if branches else []),
     )
 # patient menu options
 elif role == "Patient":
@@ -197,67 +1102,74 @@ def searchPatient(patientId, patients):
             return p
     return None 
 
-# sort list by age using bubble sort logic
-def sortPatientsByAge(patients):
-    n = len(patients)
-    for i in range(n):
-        for j in range(0, n - i - 1):
-            try:
-                age1 = int(patients[j][2])
-                age2 = int(patients[j + 1][2])
-                if age1 > age2:
-                    patients[j], patients[j + 1] = patients[j + 1], patients[j]
-            except: pass
-    return patients
-
-if "opdQueue" not in st.session_state:
-    st.session_state.opdQueue = []
+# beds and OPD queue come from the shared journaled state, caught up with
+# what other server processes changed
+getHospitalState(stateDir).refresh()
+st.session_state.opdQueue = getHospitalState(stateDir).opdQueue
+st.session_state.beds = getHospitalState(stateDir).beds
 
 # pop the first guy from queue
 def callNextOpd():
-    if len(st.session_state.opdQueue) == 0:
-        return "😴 OPD queue is empty. No patients waiting."
-    else:
-        return st.session_state.opdQueue.pop(0)
+    with getHospitalState(stateDir).locked():
+        if len(st.session_state.opdQueue) == 0:
+            return "😴 OPD queue is empty. No patients waiting."
+        else:
+            return getHospitalState(stateDir).record("opdPop")
+
+# patients per age group from an array of ages
+# bucket edges are the upper age of each group, 61+ is everything above 60
+ageGroupNames = ["0-10", "11-20", "21-30", "31-40", "41-50", "51-60", "61+"]
+
+def ageGroupCounts(ages):
+    counts = np.bincount(np.searchsorted([10, 20, 30, 40, 50, 60], ages), minlength=len(ageGroupNames))
+    return {ageGroupNames[i]: int(counts[i]) for i in range(len(ageGroupNames))}
 
 # extract all IDs from file
 def getAllPatientIds():
-    patients = readFromFile(usersFile)
-    return [p[0] for p in patients if len(p) > 0] 
+    return loadRoster().patientIds()
 
-if "beds" not in st.session_state:
-    st.session_state.beds = {
-        "B1": "FREE", "B2": "FREE", "B3": "FREE", "B4": "FREE", "B5": "FREE"
-    }
+# ids whose files are still in the working folder. bulk scans use these
+def getHotPatientIds():
+    archive = getArchiveStore(dataDir)
+    return [pid for pid in loadRoster().patientIds() if not archive.has(pid)]
+
+bedFee = 300
+
+# change a bed through the journal. the live bed dashboard reads the shared
+# state directly, so nothing has to be published
+def setBed(bedNo, occupant):
+    getHospitalState(stateDir).record("bed", bed=bedNo, value=occupant)
 
 # assign bed if available
 def allocateBed(patientId):
     beds = st.session_state.beds
-    if patientId in beds.values():
-        return "⚠️ Patient already has a bed allocated 😐"
-    for bedNo, status in beds.items():
-        if status == "FREE":
-            timeNow = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-            log = (f"\n--- BED ALLOCATED ---\n"
-                   f"Bed No: {bedNo}\n"
-                   f"Date & Time: {timeNow}\n")
-            writeToFile(f"{patientId}.txt", log)
-            beds[bedNo] = patientId
-            return f"🛏️ Bed {bedNo} successfully allocated to {patientId} ✅"
+    with getHospitalState(stateDir).locked():
+        if patientId in beds.values():
+            return "⚠️ Patient already has a bed allocated 😐"
+        for bedNo, status in beds.items():
+            if status == "FREE":
+                timeNow = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+                log = (f"\n--- BED ALLOCATED ---\n"
+                       f"Bed No: {bedNo}\n"
+                       f"Date & Time: {timeNow}\n")
+                writeToFile(patientFile(patientId), log)
+                setBed(bedNo, patientId)
+                return f"🛏️ Bed {bedNo} successfully allocated to {patientId} ✅"
     return "🚫 All beds are currently full 😴"
 
 # remove patient from bed
 def dischargeBed(patientId):
     beds = st.session_state.beds
-    for bedNo, status in beds.items():
-        if status == patientId:
-            beds[bedNo] = "FREE"
-            timeNow = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-            log = (f"\n--- BED DISCHARGED ---\n"
-                   f"Bed No: {bedNo}\n"
-                   f"Date & Time: {timeNow}\n")
-            writeToFile(f"{patientId}.txt", log)
-            return f"🛏️ {patientId} discharged from {bedNo} successfully"
+    with getHospitalState(stateDir).locked():
+        for bedNo, status in beds.items():
+            if status == patientId:
+                setBed(bedNo, "FREE")
+                timeNow = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+                log = (f"\n--- BED DISCHARGED ---\n"
+                       f"Bed No: {bedNo}\n"
+                       f"Date & Time: {timeNow}\n")
+                writeToFile(patientFile(patientId), log)
+                return f"🛏️ {patientId} discharged from {bedNo} successfully"
     return "❌ Patient not found in any bed 😐"
 
 # scan text file for keywords to calculate money
@@ -266,7 +1178,7 @@ def calculateBill(patientId):
     breakdown = []
     
     try:
-        with open(f"{patientId}.txt", "r") as file:
+        with openPatientFile(patientId) as file:
             for line in file:
                 line = line.strip()
                 if "Registration fees:" in line:
@@ -292,7 +1204,6 @@ def calculateBill(patientId):
     except FileNotFoundError:
         pass
 
-    bedFee = 300 
     inBed = False
     currentBed = ""
     
@@ -306,6 +1217,363 @@ def calculateBill(patientId):
             
     return total, breakdown, inBed, currentBed
 
+# parsers used with readPatientFilesParallel
+
+# registration time from the patient file header
+def parseRegTime(text):
+    for line in text.splitlines():
+        if "Registration Time:" in line:
+            return line.split("Registration Time:")[1].strip()
+    return "N/A"
+
+# every disease written on a Diseases: line (registration and appointments)
+def parseDiseases(text):
+    diseases = []
+    for line in text.splitlines():
+        if line.startswith("Diseases:"):
+            diseases += [d.strip() for d in line.replace("Diseases:", "").strip().split(",")]
+    return diseases
+
+# line numbers of appointments booked with this doctor
+def parseAppointments(text, doctorName):
+    lines = text.splitlines()
+    found = []
+    for i in range(len(lines)):
+        if "--- APPOINTMENT BOOKED ---" in lines[i]:
+            if i + 2 < len(lines) and doctorName in lines[i+2]:
+                found.append(i)
+    return found
+
+# hospital wide dues report
+
+# bytes kept before a checkpoint offset to spot files rewritten under us
+checkpointTail = 64
+
+# money charged and paid in a chunk of patient file text
+def parseBillTotals(text):
+    charges = 0
+    payments = 0
+    for line in text.splitlines():
+        if "Registration fees:" in line or "Appointment Fee:" in line or "PAYMENT MADE:" in line:
+            try:
+                amt = int(line.split(":")[1].strip())
+            except:
+                continue
+            if "PAYMENT MADE:" in line:
+                payments += amt
+            else:
+                charges += amt
+    return charges, payments
+
+# read only the part of a patient file added since the last report
+# falls back to the whole file when the bytes before the old offset changed,
+# e.g. after a profile update rewrote it
+# an archived record can't change, so its entry (brought up to date when it
+# was archived) is kept as it is
+def readDuesDelta(patientId, checkpoint):
+    entry = checkpoint.get(patientId)
+    archive = getArchiveStore(dataDir)
+    try:
+        if archive.has(patientId):
+            if entry:
+                return patientId, entry
+            file = io.BytesIO((archive.read(patientId) or "").encode())
+        else:
+            file = open(patientFile(patientId), "rb")
+        with file:
+            if entry:
+                start = max(entry["offset"] - checkpointTail, 0)
+                file.seek(start)
+                if file.read(entry["offset"] - start).decode("latin-1") != entry["tail"]:
+                    entry = None
+            if not entry:
+                file.seek(0)
+                entry = {"offset": 0, "tail": "", "charges": 0, "payments": 0}
+            data = file.read()
+    except OSError:
+        return patientId, None
+
+    # leave a half written last line for next time
+    data = data[:data.rfind(b"\n") + 1]
+    if not data:
+        return patientId, entry
+    charges, payments = parseBillTotals(data.decode("utf-8", "replace"))
+    offset = entry["offset"] + len(data)
+    before = (entry["tail"].encode("latin-1") + data)[-checkpointTail:]
+    return patientId, {
+        "offset": offset,
+        "tail": before.decode("latin-1"),
+        "charges": entry["charges"] + charges,
+        "payments": entry["payments"] + payments,
+    }
+
+def loadDuesCheckpoint():
+    try:
+        with open(duesCheckpointFile, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def saveDuesCheckpoint(checkpoint):
+    os.makedirs(snapshotDir, exist_ok=True)
+    tempFile = duesCheckpointFile + ".tmp"
+    with open(tempFile, "w") as file:
+        json.dump(checkpoint, file)
+    os.replace(tempFile, duesCheckpointFile)
+
+# bring the checkpoint entries of these patients up to date and save them
+# entries of everyone else are kept as they are. a read that times out
+# raises before anything is saved
+def refreshDuesCheckpoint(patientIds):
+    checkpoint = loadDuesCheckpoint()
+    for pid, entry in readPatientFilesParallel(patientIds, reader=lambda pid: readDuesDelta(pid, checkpoint)):
+        if entry:
+            checkpoint[pid] = entry
+    saveDuesCheckpoint(checkpoint)
+    return checkpoint
+
+# balance of every patient in one pass: file charges - payments + current bed
+def buildDuesReport(patientIds):
+    updated = refreshDuesCheckpoint(patientIds)
+
+    ids = np.array(patientIds, dtype=object)
+    charges = np.array([updated.get(pid, {}).get("charges", 0) for pid in patientIds], dtype=np.int64)
+    payments = np.array([updated.get(pid, {}).get("payments", 0) for pid in patientIds], dtype=np.int64)
+    bedCharges = np.isin(ids, list(st.session_state.beds.values())) * bedFee
+    return pd.DataFrame({
+        "Patient ID": ids,
+        "Charges": charges,
+        "Bed Charge": bedCharges,
+        "Paid": payments,
+        "Balance": charges + bedCharges - payments,
+    })
+
+# patients not in a bed or the OPD queue, fully paid, and with no change to
+# their file for the last `days` days
+def findArchiveCandidates(days):
+    cutoff = time.time() - days * 86400
+    active = set(st.session_state.beds.values()) | set(st.session_state.opdQueue)
+    idle = []
+    for pid in getHotPatientIds():
+        try:
+            if pid not in active and os.stat(patientFile(pid)).st_mtime < cutoff:
+                idle.append(pid)
+        except OSError:
+            pass
+    candidates = []
+    for pid, totals in readPatientFilesParallel(idle, parseBillTotals):
+        if totals and totals[0] <= totals[1]:
+            candidates.append(pid)
+    return sorted(candidates)
+
+# analytics snapshots
+
+# timestamps in the patient files come in three shapes
+timeFormats = ["%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M:%S"]
+dailyColumns = ["registrations", "admissions", "discharges", "occupancy", "billed", "collected"]
+
+# turn any of the file timestamps into a datetime, None if it is not one
+def parseTimestamp(text):
+    text = text.strip()
+    for fmt in timeFormats:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+# every dated event in a patient file as (day, column, amount)
+# fee and discharge lines have no date of their own so they take the last one seen
+def parseDailyEvents(text):
+    events = []
+    lastDay = None
+    pending = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("Registration Time:") or line.startswith("Date & Time:") or line.startswith("Date:"):
+            stamp = parseTimestamp(line.split(":", 1)[1])
+            if stamp:
+                lastDay = stamp.date()
+                if line.startswith("Registration Time:"):
+                    events.append((lastDay, "registrations", 1))
+                elif pending:
+                    events.append((lastDay, pending, 1))
+            pending = None
+        elif "--- BED ALLOCATED ---" in line:
+            pending = "admissions"
+        elif "--- BED DISCHARGED ---" in line:
+            pending = "discharges"
+        elif lastDay is None:
+            continue
+        elif "--- DISCHARGED FROM" in line:
+            events.append((lastDay, "discharges", 1))
+        elif "Registration fees:" in line or "Appointment Fee:" in line or "PAYMENT MADE:" in line:
+            try:
+                amount = int(line.split(":")[1].strip())
+            except:
+                continue
+            events.append((lastDay, "collected" if "PAYMENT MADE:" in line else "billed", amount))
+    return events
+
+# saved daily rollups, or empty columns if there is no snapshot yet
+# logOffset is where the change log entries after the last saved day start,
+# -1 when it isn't known
+def loadDailySnapshot():
+    try:
+        with np.load(dailySnapshotFile) as data:
+            snapshot = {name: data[name] for name in ["days"] + dailyColumns}
+            snapshot["logOffset"] = data["logOffset"] if "logOffset" in data.files else np.int64(-1)
+            return snapshot
+    except (OSError, KeyError, ValueError):
+        snapshot = {name: np.zeros(0, dtype=np.int64) for name in dailyColumns}
+        snapshot["days"] = np.zeros(0, dtype="datetime64[D]")
+        snapshot["logOffset"] = np.int64(-1)
+        return snapshot
+
+# write to a temp file first so a crash never leaves half a snapshot
+def saveDailySnapshot(snapshot):
+    os.makedirs(snapshotDir, exist_ok=True)
+    tempFile = dailySnapshotFile + ".tmp"
+    with open(tempFile, "wb") as file:
+        np.savez(file, **snapshot)
+    os.replace(tempFile, dailySnapshotFile)
+
+# bring the daily snapshot up to yesterday and work out today's partial row
+# only files touched since the last saved day are read, and only their newer
+# events are counted, so saved history is never recomputed. every patient file
+# write goes through the change log, so those files are found by reading the
+# log from where the last saved day ended instead of checking every file
+# a rebuild reads every record, archived ones from the archive
+# a read that times out raises before anything is saved
+def refreshDailySnapshot(patientIds):
+    snapshot = loadDailySnapshot()
+    today = date.today()
+    lastSaved = snapshot["days"][-1].astype(object) if len(snapshot["days"]) else None
+
+    cutoff = 0
+    if lastSaved:
+        cutoff = datetime.combine(lastSaved + timedelta(days=1), datetime.min.time()).timestamp()
+    todayStart = datetime.combine(today, datetime.min.time()).timestamp()
+    logOffset = int(snapshot["logOffset"])
+    try:
+        logSize = os.path.getsize(changeLogFile)
+    except OSError:
+        logSize = 0
+    # an unknown offset reads the log from the start. a log shorter than the
+    # offset was started over and can't say what changed, so all files are read
+    entries, logEnd = getChangeLog().entriesFrom(logOffset if 0 <= logOffset <= logSize else 0)
+    if lastSaved is None or logOffset > logSize:
+        changed = list(patientIds)
+    else:
+        touched = {os.path.basename(path)[:-4] for offset, changeTime, path in entries
+                   if changeTime >= cutoff and os.path.dirname(path) == dataDir and path.endswith(".txt")}
+        changed = [pid for pid in patientIds if pid in touched]
+    # where today's entries start, the offset to keep once yesterday is saved
+    todayOffset = next((offset for offset, changeTime, path in entries if changeTime >= todayStart), logEnd)
+
+    totals = {}
+    for pid, events in readPatientFilesParallel(changed, parseDailyEvents):
+        for day, column, amount in events or []:
+            if (lastSaved is None or day > lastSaved) and day <= today:
+                row = totals.setdefault(day, dict.fromkeys(dailyColumns, 0))
+                row[column] += amount
+
+    firstDay = lastSaved + timedelta(days=1) if lastSaved else min(totals, default=today)
+    days = np.arange(np.datetime64(firstDay), np.datetime64(today) + 1, dtype="datetime64[D]")
+    newRows = {name: np.zeros(len(days), dtype=np.int64) for name in dailyColumns}
+    for i, day in enumerate(days.astype(object)):
+        for column, amount in totals.get(day, {}).items():
+            newRows[column][i] = amount
+    startOccupancy = int(snapshot["occupancy"][-1]) if len(snapshot["occupancy"]) else 0
+    newRows["occupancy"] = np.maximum(startOccupancy + np.cumsum(newRows["admissions"] - newRows["discharges"]), 0)
+
+    # everything before today is final and goes into the snapshot. the offset
+    # is also saved when only it changed, so the log isn't read from the
+    # start again on every render
+    if len(days) > 1 or (lastSaved and todayOffset != logOffset):
+        snapshot["days"] = np.concatenate([snapshot["days"], days[:-1]])
+        for name in dailyColumns:
+            snapshot[name] = np.concatenate([snapshot[name], newRows[name][:-1]])
+        snapshot["logOffset"] = np.int64(todayOffset)
+        saveDailySnapshot(snapshot)
+
+    todayRow = {name: int(newRows[name][-1]) for name in dailyColumns}
+    return snapshot, todayRow
+
+# live dashboard fragments. they rerun on their own every few seconds but only
+# redraw themselves, and read shared state or the event bus instead of rescanning
+
+# beds are the shared journaled state, so every tick just catches up with
+# other processes and shows that dict
+@st.fragment(run_every=liveRefreshSeconds)
+def liveBedStatus():
+    getHospitalState(stateDir).refresh()
+    st.write(st.session_state.beds)
+
+# (patient id, name, appointment line) for every appointment, in Users.txt order
+def appointmentRows(appointments):
+    roster = loadRoster()
+    wanted = np.array([pid.encode() for pid in appointments], dtype=bytes)
+    rows = []
+    for index in np.flatnonzero(np.isin(roster.ids, wanted)):
+        p = roster[int(index)]
+        rows += [(p.pid, p.name, i) for i in appointments[p.pid]]
+    return rows
+
+# only patients with appointments are kept in the cache. a tick with no new
+# events reads nothing and just draws the saved rows again
+@st.fragment(run_every=liveRefreshSeconds)
+def liveAppointments(doctorName):
+    cache = st.session_state.get("appointmentCache")
+    seq, events, complete = getEventBus(dataDir).since(cache["seq"] if cache else 0, "files")
+    parser = lambda text: parseAppointments(text, doctorName)
+
+    try:
+        if not cache or not complete or cache["doctor"] != doctorName:
+            # first time or we missed events, scan every patient file
+            startTime = time.perf_counter()
+            found = readPatientFilesMap(getHotPatientIds(), parser)
+            appointments = {pid: lines for pid, lines in found.items() if lines}
+            cache = {
+                "doctor": doctorName,
+                "appointments": appointments,
+                "rows": appointmentRows(appointments),
+                "note": f"⏱️ Read {len(found)} patient files in {(time.perf_counter() - startTime) * 1000:.0f} ms",
+            }
+        elif events:
+            # only re-read the patient files that were written since last time
+            changed = {os.path.basename(e[2])[:-4] for e in events if e[2].endswith(".txt") and e[2] not in (usersFile, doctorsFile)}
+            if changed:
+                for pid, lines in readPatientFilesMap(changed, parser).items():
+                    if lines:
+                        cache["appointments"][pid] = lines
+                    else:
+                        cache["appointments"].pop(pid, None)
+                cache["rows"] = appointmentRows(cache["appointments"])
+                cache["note"] = f"🔄 Refreshed {len(changed)} updated patient file(s) at {datetime.now().strftime('%H:%M:%S')}"
+        cache["seq"] = seq
+        st.session_state["appointmentCache"] = cache
+    except ReadTimeoutError as e:
+        # keep the old seq so the same files are tried again
+        st.warning(f"⚠️ {e}. Trying again on the next refresh.")
+        if not cache:
+            return
+    st.caption(cache["note"])
+
+    for pid, name, i in cache["rows"]:
+        with st.container():
+            st.markdown(f"**👤 {name}** (`{pid}`)")
+            st.caption("Has booked an appointment.")
+            if st.button("Mark Treated", key=f"btn_{pid}_{i}"):
+                st.session_state["menu"] = "Add Prescription"
+                st.session_state["prescribe_patient"] = pid
+                st.success("Patient marked as treated. Switching to Add Prescription...")
+                st.rerun()
+            st.markdown("---")
+
+    if not cache["rows"]:
+        st.warning("📭 No appointments found.")
+
 # start of menu handling
 
 if menu == "Add Patient":
@@ -326,11 +1594,6 @@ if menu == "Add Patient":
         address = st.text_area("Address", height=100)
     disease = st.multiselect("Diseases/Symptoms", diseaseList)
 
-    # auto create id
-    patientId = ""
-    if name and age:
-        patientId = "pat" + name[:3].lower() + str(age)
-
     if st.button("Save Patient"):
         try:
             # check inputs
@@ -346,21 +1609,16 @@ if menu == "Add Patient":
             if not contact.isdigit() or len(contact) != 10:
                 raise ValidationError("❌ Contact number must be exactly 10 digits.")
 
-            # check for duplicates
-            try:
-                currentUsers = readFromFile(usersFile)
-                for u in currentUsers:
-                    if len(u) > 0 and u[0] == patientId:
-                        raise ValidationError("⚠️ Patient ID conflict! Try adding middle name or changing format.")
-            except FileNotFoundError:
-                pass
-            
             # create password key
             passKey = name.split()[0] + "@" + str(age)
             
-            # save to master file
+            # auto create a unique id and save to master file
             # format: patientId, password, age, name, contact
-            writeToFile(usersFile, f"{patientId},{passKey},{age},{name},{contact}")
+            patientId = getIdAllocator().register(
+                usersFile, "pat" + name[:3].lower() + str(age), "pat",
+                lambda newId: f"{newId},{passKey},{age},{name},{contact}",
+                getBranchRouter(tuple(branches)), st.session_state["branch"]
+            )
 
             # save detailed info to individual file
             patientDetails = (
@@ -377,7 +1635,7 @@ if menu == "Add Patient":
                 f"Registration fees: 1000  \n"
             )
 
-            writeToFile(f"{patientId}.txt", patientDetails)
+            writeToFile(patientFile(patientId), patientDetails)
             
             st.success(f"✅ Patient Registered Successfully!")
             st.info(f"🆔 **Patient ID:** {patientId} (Use this as Username)")
@@ -388,32 +1646,30 @@ if menu == "Add Patient":
 
 elif menu == "View Patients":
     st.subheader("📋 Registered Patients")
-    patients = readFromFile(usersFile)
-    if not patients:
+    roster = loadRoster()
+    if not len(roster):
         st.warning("No patients found.")
     else:
+        # read all registration times in parallel
+        startTime = time.perf_counter()
+        regTimes = {}
+        try:
+            for pid, regTime in readPatientFilesParallel(getHotPatientIds(), parseRegTime):
+                regTimes[pid] = regTime
+        except ReadTimeoutError as e:
+            st.warning(f"⚠️ {e}. Some registration times are missing.")
+        st.caption(f"⏱️ Read {len(regTimes)} patient files in {(time.perf_counter() - startTime) * 1000:.0f} ms")
+
         # Sort patients by registration time (newest first)
         patient_details = []
-        for p in patients:
-            if len(p) > 3:
-                pid = p[0]
-                name = p[3]
-                age = p[2]
-                contact = p[4] if len(p) > 4 else "N/A"
-                reg_time = "N/A"
-                try:
-                    with open(f"{pid}.txt", "r") as file:
-                        for line in file:
-                            if "Registration Time:" in line:
-                                reg_time = line.split("Registration Time:")[1].strip()
-                                break
-                except:
-                    pass
-                patient_details.append((pid, name, age, contact, reg_time))
+        for p in roster:
+            pid = p.pid
+            reg_time = regTimes.get(pid) or ("Archived" if getArchiveStore(dataDir).has(pid) else "N/A")
+            patient_details.append((pid, p.name, p.age, p.contact, reg_time))
         
         # Sort by registration time (assuming format YYYY-MM-DD HH:MM:SS)
         try:
-            patient_details.sort(key=lambda x: x[4] if x[4] != "N/A" else "0000-00-00 00:00:00", reverse=True)
+            patient_details.sort(key=lambda x: x[4] if x[4][:1].isdigit() else "0000-00-00 00:00:00", reverse=True)
         except:
             pass
         
@@ -426,7 +1682,7 @@ elif menu == "View Patients":
                 with col2:
                     if st.button("View Full Details", key=f"view_{pid}"):
                         try:
-                            with open(f"{pid}.txt", "r") as f:
+                            with openPatientFile(pid) as f:
                                 details = f.read()
                             st.text_area("Patient Details", details, height=250, key=f"details_{pid}")
                         except:
@@ -437,29 +1693,22 @@ elif menu == "Search Patient":
     pid = st.selectbox("Select Patient ID to Search", getAllPatientIds())
     if st.button("Search"):
         # search by id at index 0
-        result = None
-        patients = readFromFile(usersFile)
-        for p in patients:
-            if len(p) > 0 and p[0] == pid:
-                result = p
-                break
+        result = loadRoster().find(pid) if pid else None
                 
         if result:
-            st.success(f"Found: {result[3]}")
+            st.success(f"Found: {result.name}")
             # show full file if exists
-            if os.path.exists(f"{pid}.txt"):
-                with open(f"{pid}.txt", "r") as f:
+            if patientFileExists(pid):
+                with openPatientFile(pid) as f:
                     st.text(f.read())
             else:
-                st.write(f"Basic Info: Name: {result[3]}, Age: {result[2]}")
+                st.write(f"Basic Info: Name: {result.name}, Age: {result.age}")
         else:
             st.error("❌ Patient not found 😐")
 
 elif menu == "Sort Patients by Age":
-    patients = sortPatientsByAge(readFromFile(usersFile))
-    for p in patients:
-        if len(p) > 3:
-            st.write(f"🧑 ID: {p[0]} | Name: {p[3]} | Age: {p[2]}")
+    for p in loadRoster().sortedByAge():
+        st.write(f"🧑 ID: {p.pid} | Name: {p.name} | Age: {p.age}")
         st.write("---")
 
 elif menu == "OPD Queue":   
@@ -470,7 +1719,7 @@ elif menu == "OPD Queue":
     else:
         pid = st.selectbox("Choose Patient ID", patientIds)
         if st.button("Add to OPD"):
-            st.session_state.opdQueue.append(pid)
+            getHospitalState(stateDir).record("opdAdd", pid=pid)
             st.success(f"🧾 {pid} added to OPD queue ✅")
         st.info(f"📋 Current Queue: {st.session_state.opdQueue}")
         if st.button("Call Next"):
@@ -491,7 +1740,7 @@ elif menu == "Bed Allocation":
             if st.button("Discharge Patient"):
                 st.info(dischargeBed(pid))
     st.subheader("📊 Live Bed Status")
-    st.write(st.session_state.beds)
+    liveBedStatus()
 
 elif menu == "Add Doctor":
     st.subheader("👨‍⚕️ Add Doctor Profile")
@@ -510,10 +1759,6 @@ elif menu == "Add Doctor":
         experience = st.number_input("Experience (Years)", min_value=0, step=1)
         contact = st.text_input("Contact Number", max_chars=10)
 
-    did = ""
-    if dname.strip():
-        did = "doc" + dname.strip().replace(" ", "")[:3].lower() + str(age)
-
     if st.button("Add Doctor"):
         try:
             # validate doctor inputs
@@ -526,15 +1771,12 @@ elif menu == "Add Doctor":
             if not contact.isdigit() or len(contact) != 10:
                 raise ValidationError("❌ Contact number must be 10 digits.")
 
-            doctors = readFromFile(doctorsFile)
-            existingIds = [d[0] for d in doctors if len(d)>0]
-            
-            if did in existingIds:
-                raise ValidationError("⚠️ Doctor already exists in system.")
-
-            # save doctor data
-            dataLine = f"{did},{dname},{spec},{gender},{qualification},{experience} yrs,{contact}"
-            writeToFile(doctorsFile, dataLine)
+            # auto create a unique id and save doctor data
+            did = getIdAllocator().register(
+                doctorsFile, "doc" + dname.strip().replace(" ", "")[:3].lower() + str(age), "doc",
+                lambda newId: f"{newId},{dname},{spec},{gender},{qualification},{experience} yrs,{contact}",
+                getBranchRouter(tuple(branches)), st.session_state["branch"]
+            )
             
             st.success(f"👨‍⚕️ Doctor added successfully! ✅")
             st.info(f"🆔 **Doctor ID:** {did}")
@@ -546,43 +1788,29 @@ elif menu == "Add Doctor":
 elif menu == "Statistics":
     st.subheader("📈 Hospital Insights")
 
-    patients = readFromFile("Users.txt")
-    if not patients:
+    roster = loadRoster()
+    if not len(roster):
         st.warning("⚠️ No patient data available 😐")
         st.stop()
 
-    ages = [int(p[2]) for p in patients]
-    st.info(f"👥 Total Patients Registered: {len(patients)}")
-    st.success(f"📊 Average Patient Age: {sum(ages)//len(ages)} years")
+    ages = roster.validAges()
+    st.info(f"👥 Total Patients Registered: {len(roster)}")
+    if len(ages):
+        st.success(f"📊 Average Patient Age: {int(ages.sum()) // len(ages)} years")
 
-    age_groups = {
-        "0-10": 0, "11-20": 0, "21-30": 0,
-        "31-40": 0, "41-50": 0, "51-60": 0, "61+": 0
-    }
-
-    for age in ages:
-        if age <= 10: age_groups["0-10"] += 1
-        elif age <= 20: age_groups["11-20"] += 1
-        elif age <= 30: age_groups["21-30"] += 1
-        elif age <= 40: age_groups["31-40"] += 1
-        elif age <= 50: age_groups["41-50"] += 1
-        elif age <= 60: age_groups["51-60"] += 1
-        else: age_groups["61+"] += 1
-
-    st.bar_chart(age_groups)
+    st.bar_chart(ageGroupCounts(ages))
 
     diseaseCount = {}
-    for p in patients:
-        pid = p[0]
-        try:
-            with open(f"{pid}.txt", "r") as file:
-                for line in file:
-                    if line.startswith("Diseases:"):
-                        diseases = line.replace("Diseases:", "").strip().split(",")
-                        for d in diseases:
-                            diseaseCount[d.strip()] = diseaseCount.get(d.strip(), 0) + 1
-        except:
-            pass
+    startTime = time.perf_counter()
+    scanned = 0
+    try:
+        for pid, diseases in readPatientFilesParallel(getHotPatientIds(), parseDiseases):
+            scanned += 1
+            for d in diseases or []:
+                diseaseCount[d] = diseaseCount.get(d, 0) + 1
+    except ReadTimeoutError as e:
+        st.warning(f"⚠️ {e}. Disease counts below are incomplete.")
+    st.caption(f"⏱️ Read {scanned} patient files in {(time.perf_counter() - startTime) * 1000:.0f} ms")
 
     if diseaseCount:
         st.info(f"🦠 Total Disease Types Recorded: {len(diseaseCount)}")
@@ -590,11 +1818,180 @@ elif menu == "Statistics":
     else:
         st.warning("⚠️ No disease data found 😐")
 
+    st.subheader("📆 Daily Trends")
+    if st.button("Rebuild Snapshot"):
+        try:
+            os.remove(dailySnapshotFile)
+        except OSError:
+            pass
+    startTime = time.perf_counter()
+    try:
+        snapshot, todayRow = refreshDailySnapshot(getAllPatientIds())
+    except ReadTimeoutError as e:
+        st.error(f"❌ {e}. The daily snapshot was not updated, try again in a moment.")
+        st.stop()
+    trends = pd.DataFrame({name: snapshot[name] for name in dailyColumns}, index=pd.to_datetime(snapshot["days"]))
+    trends.loc[pd.Timestamp(date.today())] = todayRow
+    st.caption(f"⏱️ {len(snapshot['days'])} saved days loaded and today updated in {(time.perf_counter() - startTime) * 1000:.0f} ms")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Registrations Today", todayRow["registrations"])
+    col2.metric("Beds Occupied", todayRow["occupancy"])
+    col3.metric("Collected Today", f"Rs. {todayRow['collected']}")
+
+    st.write("🧑 Daily Registrations")
+    st.line_chart(trends[["registrations"]])
+    st.write("🛏️ Bed Occupancy")
+    st.line_chart(trends[["admissions", "discharges", "occupancy"]])
+    st.write("💰 Revenue (Rs.)")
+    st.line_chart(trends[["billed", "collected"]])
+
+elif menu == "Dues Report":
+    st.subheader("💰 Outstanding Dues & Revenue")
+
+    roster = loadRoster()
+    if not len(roster):
+        st.warning("⚠️ No patient data available 😐")
+        st.stop()
+
+    startTime = time.perf_counter()
+    try:
+        report = buildDuesReport(roster.patientIds())
+    except ReadTimeoutError as e:
+        st.error(f"❌ {e}. The dues report was not built, try again in a moment.")
+        st.stop()
+    report.insert(1, "Name", [p.name for p in roster])
+    st.caption(f"⏱️ Report for {len(report)} patients built in {(time.perf_counter() - startTime) * 1000:.0f} ms")
+
+    balances = report["Balance"].to_numpy()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Receivables", f"Rs. {int(balances[balances > 0].sum())}")
+    col2.metric("Total Billed", f"Rs. {int(report['Charges'].sum() + report['Bed Charge'].sum())}")
+    col3.metric("Total Collected", f"Rs. {int(report['Paid'].sum())}")
+
+    sortBy = st.selectbox("Sort by", ["Amount Owed (High to Low)", "Amount Owed (Low to High)", "Patient ID"])
+    if sortBy == "Patient ID":
+        report = report.sort_values("Patient ID")
+    else:
+        report = report.sort_values("Balance", ascending=(sortBy == "Amount Owed (Low to High)"), kind="stable")
+
+    if st.checkbox("Only patients with dues", value=True):
+        report = report[report["Balance"] > 0]
+    st.dataframe(report, hide_index=True)
+
+elif menu == "Archive Records":
+    st.subheader("🗄️ Archive Discharged Patients")
+    st.info("Settled, discharged patients with no activity are moved to compressed archive files. "
+            "Their records can still be searched and viewed.")
+
+    archive = getArchiveStore(dataDir)
+    col1, col2 = st.columns(2)
+    col1.metric("Active Records", len(getHotPatientIds()))
+    col2.metric("Archived Records", len(archive.index))
+
+    days = st.number_input("Archive patients with no activity for (days)", min_value=1, value=archiveAfterDays, step=1)
+    try:
+        candidates = findArchiveCandidates(days)
+    except ReadTimeoutError as e:
+        st.error(f"❌ {e}. Try again in a moment.")
+        st.stop()
+    if not candidates:
+        st.success("✅ Nothing to archive right now.")
+    else:
+        st.write(f"📦 {len(candidates)} patient record(s) ready to archive:")
+        st.caption(", ".join(candidates))
+        if st.button("Archive Now"):
+            # their dues are brought up to date first and stay frozen in the
+            # checkpoint while archived, so the Dues Report keeps counting them
+            try:
+                refreshDuesCheckpoint(candidates)
+            except ReadTimeoutError as e:
+                st.error(f"❌ {e}. Nothing was archived, try again in a moment.")
+                st.stop()
+            moved = archive.archive(candidates)
+            st.success(f"🗄️ Archived {moved} patient record(s) ✅")
+            st.rerun()
+
+elif menu == "Replication":
+    st.subheader("🔁 Standby Replication")
+    st.info(f"Every file change is recorded in `{changeLogFile}`. "
+            f"Run `python replica.py --follow` to keep `{standbyDir}/` up to date.")
+
+    headSeq, headTime = getChangeLog().head()
+    standby = None
+    try:
+        with open(standbyStatusFile, "r") as file:
+            standby = json.load(file)
+    except (OSError, ValueError):
+        pass
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Changes Logged", headSeq)
+    if standby is None:
+        col2.metric("Standby Applied", "—")
+        st.warning("⚠️ No standby has reported yet 😐")
+    else:
+        behind = headSeq - standby["seq"]
+        col2.metric("Standby Applied", standby["seq"])
+        col3.metric("Lag", f"{behind} changes", f"{max(headTime - standby['time'], 0):.1f} s behind" if behind else "in sync",
+                    delta_color="off")
+        st.caption(f"🕒 Standby last checked in at {datetime.fromtimestamp(standby['checked']).strftime('%d-%m-%Y %H:%M:%S')}")
+        if standby.get("error"):
+            st.error(f"❌ Standby stopped: {standby['error']}")
+        elif standby.get("waiting"):
+            st.warning(f"⚠️ Standby waiting: {standby['waiting']}")
+
+elif menu == "Branch Overview":
+    st.subheader("🏥 All Branches")
+
+    # cross-branch search, every branch is searched at the same time
+    query = st.text_input("Search all branches by Patient ID or Name").strip().lower()
+    if query:
+        def searchBranch(branch):
+            where = {0: lambda v: query in v.lower()} if query.startswith("pat") else {3: lambda v: query in v.lower()}
+            return list(iterRecords(os.path.join(branchDir(branch), "Users.txt"), where, fields=(0, 3, 2, 4), limit=50))
+        rows = []
+        for branch, found in runOnBranches(branches, searchBranch).items():
+            rows += [(branch,) + p for p in found]
+        if rows:
+            st.dataframe(pd.DataFrame(rows, columns=["Branch", "Patient ID", "Name", "Age", "Contact"]), hide_index=True)
+        else:
+            st.warning("❌ No matching patients in any branch 😐")
+
+    # per branch numbers, worked out in parallel and merged
+    def branchStats(branch):
+        folder = branchDir(branch)
+        roster = PatientRoster(iterRecords(os.path.join(folder, "Users.txt")))
+        state = getHospitalState(os.path.join(folder, "state"))
+        with state.locked():
+            beds = dict(state.beds)
+        doctors = sum(1 for _ in iterRecords(os.path.join(folder, "Doctors.txt"), fields=(0,)))
+        return roster.validAges(), len(roster), doctors, sum(1 for b in beds.values() if b != "FREE"), len(beds)
+
+    startTime = time.perf_counter()
+    stats = runOnBranches(branches, branchStats)
+    st.caption(f"⏱️ {len(branches)} branches scanned in {(time.perf_counter() - startTime) * 1000:.0f} ms")
+
+    summary = pd.DataFrame(
+        [(branch, patients, int(ages.mean()) if len(ages) else 0, doctors, f"{used}/{total}")
+         for branch, (ages, patients, doctors, used, total) in stats.items()],
+        columns=["Branch", "Patients", "Avg Age", "Doctors", "Beds Used"]
+    )
+    allAges = np.concatenate([s[0] for s in stats.values()]) if stats else np.zeros(0, dtype=np.int16)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Patients", int(summary["Patients"].sum()))
+    col2.metric("Average Age", f"{int(allAges.mean()) if len(allAges) else 0} years")
+    col3.metric("Total Doctors", int(summary["Doctors"].sum()))
+    st.dataframe(summary, hide_index=True)
+
+    st.write("👥 Age Groups by Branch")
+    st.bar_chart(pd.DataFrame({branch: ageGroupCounts(s[0]) for branch, s in stats.items()}))
+
 elif menu == "View My Details":
     st.subheader("👤 My Patient Details")
     patientData = ""
     try:
-        with open(f"{username}.txt", "r") as file:
+        with openPatientFile(username) as file:
             patientData = file.read()
         st.text(patientData)
         st.download_button(
@@ -622,13 +2019,12 @@ elif menu == "Book Appointment":
 
         if st.button("Confirm Booking"):
             assignedDocs = []
-            doctors = readFromFile(doctorsFile)
             for d in disease:
                 spec = diseaseDoctorMap.get(d, "General Physician")
-                # Find actual doctor names with this specialization
-                doc_names = [doc[1] for doc in doctors if len(doc) > 2 and doc[2] == spec]
-                if doc_names:
-                    assignedDocs.append(doc_names[0])  # Assign the first available doctor
+                # Find the first doctor with this specialization
+                doc = findRecord(doctorsFile, {2: spec}, fields=(1,))
+                if doc:
+                    assignedDocs.append(doc[0])  # Assign the first available doctor
                 else:
                     assignedDocs.append(spec)  # Fallback to specialization if no doctor found
             
@@ -640,14 +2036,14 @@ elif menu == "Book Appointment":
                    f"Diseases: {', '.join(disease)}\n"
                    f"Doctors: {', '.join(assignedDocs)}\n"
                    f"Date & Time: {datetime.now().strftime('%d-%m-%Y %H:%M:%S')}\n")
-            writeToFile(f"{username}.txt", log)
-            writeToFile(f"{username}.txt", f"Appointment Fee: {totalConsultation}")
+            writeToFile(patientFile(username), log)
+            writeToFile(patientFile(username), f"Appointment Fee: {totalConsultation}")
 
 elif menu == "View Prescriptions":
     st.subheader("💊 My Prescriptions")
     prescriptions = ""
     try:
-        with open(f"{username}.txt", "r") as file:
+        with openPatientFile(username) as file:
             for line in file:
                 if "Prescription:" in line:
                     prescriptions += line + "\n"
@@ -697,11 +2093,11 @@ elif menu == "Discharge & Pay Bill":
                                f"Method: Card\n"
                                f"PAYMENT MADE: {totalAmount}\n"
                                f"Status: Success\n")
-                        writeToFile(f"{username}.txt", log)
+                        writeToFile(patientFile(username), log)
                         
                         if isInBed:
-                            st.session_state.beds[bedNo] = "FREE"
-                            writeToFile(f"{username}.txt", f"--- DISCHARGED FROM {bedNo} ---\n")
+                            setBed(bedNo, "FREE")
+                            writeToFile(patientFile(username), f"--- DISCHARGED FROM {bedNo} ---\n")
                         
                         st.success("✅ Payment Successful! You are discharged.")
                         st.rerun()
@@ -717,19 +2113,19 @@ elif menu == "Discharge & Pay Bill":
                            f"Method: UPI\n"
                            f"PAYMENT MADE: {totalAmount}\n"
                            f"Status: Success\n")
-                    writeToFile(f"{username}.txt", log)
+                    writeToFile(patientFile(username), log)
                     
                     if isInBed:
-                        st.session_state.beds[bedNo] = "FREE"
-                        writeToFile(f"{username}.txt", f"--- DISCHARGED FROM {bedNo} ---\n")
+                        setBed(bedNo, "FREE")
+                        writeToFile(patientFile(username), f"--- DISCHARGED FROM {bedNo} ---\n")
             
                     st.success("✅ Payment Verified! You are discharged.")
                     st.rerun()
 
         elif totalAmount == 0 and isInBed:
             if st.button("Discharge (No Dues)"):
-                st.session_state.beds[bedNo] = "FREE"
-                writeToFile(f"{username}.txt", f"--- DISCHARGED FROM {bedNo} ---\n")
+                setBed(bedNo, "FREE")
+                writeToFile(patientFile(username), f"--- DISCHARGED FROM {bedNo} ---\n")
                 st.success(f"✅ Discharged from {bedNo}.")
                 st.rerun()
         elif totalAmount < 0:
@@ -743,7 +2139,7 @@ elif menu == "Update Profile":
     current_contact = ""
     current_address = ""
     try:
-        with open(f"{username}.txt", "r") as file:
+        with openPatientFile(username) as file:
             for line in file:
                 if line.startswith("Contact:"):
                     current_contact = line.split("Contact:")[1].strip()
@@ -766,26 +2162,26 @@ elif menu == "Update Profile":
                 st.error("❌ Contact number must be 10 digits.")
             else:
                 # Read the entire file
-                with open(f"{username}.txt", "r") as file:
+                getArchiveStore(dataDir).restore(username)
+                with open(patientFile(username), "r") as file:
                     lines = file.readlines()
                 
                 # Update the lines
-                with open(f"{username}.txt", "w") as file:
-                    for line in lines:
-                        if line.startswith("Contact:"):
-                            file.write(f"Contact: {new_contact}\n")
-                        elif line.startswith("Address:"):
-                            file.write(f"Address: {new_address}\n")
-                        else:
-                            file.write(line)
+                newLines = []
+                for line in lines:
+                    if line.startswith("Contact:"):
+                        newLines.append(f"Contact: {new_contact}\n")
+                    elif line.startswith("Address:"):
+                        newLines.append(f"Address: {new_address}\n")
+                    else:
+                        newLines.append(line)
+                replaceFile(patientFile(username), "".join(newLines))
                 
                 # Also update in Users.txt
-                patients = readFromFile(usersFile)
-                with open(usersFile, "w") as file:
-                    for p in patients:
-                        if len(p) > 0 and p[0] == username:
-                            p[4] = new_contact  # assuming contact is at index 4
-                        file.write(",".join(p) + "\n")
+                p = findRecord(usersFile, {0: username})
+                if p and len(p) > 4:
+                    p[4] = new_contact  # assuming contact is at index 4
+                    updateRow(usersFile, username, ",".join(p))
                 
                 st.success("✅ Profile updated successfully!")
                 st.rerun()
@@ -804,40 +2200,39 @@ elif menu == "Medical History":
     }
 
     try:
-        with open(f"{username}.txt", "r") as file:
-            lines = file.readlines()
-            for i, line in enumerate(lines):
-                if "--- APPOINTMENT BOOKED ---" in line:
-                    try:
-                        diseases = lines[i+1].strip().replace("Diseases: ", "")
-                        doctors = lines[i+2].strip().replace("Doctors: ", "")
-                        date_time = lines[i+3].strip().replace("Date & Time: ", "")
-                        history["Appointments"].append(f"{date_time}: {diseases} - Dr. {doctors}")
-                    except:
-                        pass
-                elif "--- PRESCRIPTION ADDED ---" in line:
-                    try:
-                        doctor = lines[i+1].strip().replace("Doctor ID: ", "")
-                        prescription = lines[i+2].strip().replace("Prescription: ", "")
-                        date_time = lines[i+3].strip().replace("Date & Time: ", "")
-                        history["Prescriptions"].append(f"{date_time}: {prescription} (Dr. {doctor})")
-                    except:
-                        pass
-                elif "--- BED ALLOCATED ---" in line:
-                    try:
-                        bed = lines[i+1].strip().replace("Bed No: ", "")
-                        date_time = lines[i+2].strip().replace("Date & Time: ", "")
-                        history["Bed Allocations"].append(f"{date_time}: Allocated to {bed}")
-                    except:
-                        pass
-                elif "--- PAYMENT RECEIPT ---" in line:
-                    try:
-                        method = lines[i+2].strip().replace("Method: ", "")
-                        amount = lines[i+3].strip().replace("PAYMENT MADE: ", "")
-                        date = lines[i+1].strip().replace("Date: ", "")
-                        history["Payments"].append(f"{date}: Rs. {amount} via {method}")
-                    except:
-                        pass
+        wanted = {"APPOINTMENT BOOKED", "PRESCRIPTION ADDED", "BED ALLOCATED", "PAYMENT RECEIPT"}
+        for header, lines in iterEvents(username, wanted):
+            if header == "APPOINTMENT BOOKED":
+                try:
+                    diseases = lines[0].replace("Diseases: ", "")
+                    doctors = lines[1].replace("Doctors: ", "")
+                    date_time = lines[2].replace("Date & Time: ", "")
+                    history["Appointments"].append(f"{date_time}: {diseases} - Dr. {doctors}")
+                except:
+                    pass
+            elif header == "PRESCRIPTION ADDED":
+                try:
+                    doctor = lines[0].replace("Doctor ID: ", "")
+                    prescription = lines[1].replace("Prescription: ", "")
+                    date_time = lines[2].replace("Date & Time: ", "")
+                    history["Prescriptions"].append(f"{date_time}: {prescription} (Dr. {doctor})")
+                except:
+                    pass
+            elif header == "BED ALLOCATED":
+                try:
+                    bed = lines[0].replace("Bed No: ", "")
+                    date_time = lines[1].replace("Date & Time: ", "")
+                    history["Bed Allocations"].append(f"{date_time}: Allocated to {bed}")
+                except:
+                    pass
+            elif header == "PAYMENT RECEIPT":
+                try:
+                    method = lines[1].replace("Method: ", "")
+                    amount = lines[2].replace("PAYMENT MADE: ", "")
+                    date = lines[0].replace("Date: ", "")
+                    history["Payments"].append(f"{date}: Rs. {amount} via {method}")
+                except:
+                    pass
 
     except FileNotFoundError:
         st.error("❌ No medical history found.")
@@ -854,51 +2249,18 @@ elif menu == "Medical History":
 elif menu == "View Appointments":
     st.subheader("📅 Doctor's Appointments")
     
-    doctors = readFromFile(doctorsFile)
     mySpec = ""
     myName = ""
     
-    for doc in doctors:
-        if len(doc) > 0 and doc[0] == username:
-            myName = doc[1]
-            mySpec = doc[2]
-            break
+    doc = findRecord(doctorsFile, {0: username}, fields=(1, 2))
+    if doc:
+        myName, mySpec = doc
             
     if not mySpec:
         st.error("❌ Doctor profile not found.")
     else:
         st.info(f"👨‍⚕️ Welcome Dr. {myName} ({mySpec})")
-        
-        patients = readFromFile(usersFile)
-        foundAny = False
-
-        for p in patients:
-            if len(p) > 1:
-                pid = p[0] 
-                pname = p[3]
-                try:
-                    with open(f"{pid}.txt", "r") as file:
-                        lines = file.readlines()
-                        for i in range(len(lines)):
-                            if "--- APPOINTMENT BOOKED ---" in lines[i]:
-                                try:
-                                    docLine = lines[i+2].strip() 
-                                    if myName in docLine: 
-                                        with st.container():
-                                            st.markdown(f"**👤 {pname}** (`{pid}`)")
-                                            st.caption("Has booked an appointment.")
-                                            if st.button("Mark Treated", key=f"btn_{pid}_{i}"):
-                                                st.session_state["menu"] = "Add Prescription"
-                                                st.session_state["prescribe_patient"] = pid
-                                                st.success("Patient marked as treated. Switching to Add Prescription...")
-                                                st.rerun()
-                                            st.markdown("---")
-                                        foundAny = True
-                                except: pass
-                except: pass
-
-        if not foundAny:
-            st.warning("📭 No appointments found.")
+        liveAppointments(myName)
 
 elif menu == "Add Prescription":
     st.subheader("💊 Add Prescription")
@@ -907,8 +2269,7 @@ elif menu == "Add Prescription":
         pId = st.text_input("Patient ID", value=st.session_state["prescribe_patient"])
         st.info("💡 Patient ID pre-filled from treated appointment.")
     else:
-        patients = readFromFile(usersFile)
-        patientOptions = {f"{p[0]} - {p[3]}": p[0] for p in patients if len(p) > 3}
+        patientOptions = {f"{p.pid} - {p.name}": p.pid for p in loadRoster()}
         selected = st.selectbox("Select Patient ID with Name", list(patientOptions.keys()))
         pId = patientOptions[selected]
     
@@ -918,13 +2279,12 @@ elif menu == "Add Prescription":
         if not pId or not prescriptionText:
              st.warning("⚠️ Please enter both Patient ID and Prescription details.")
         else:
-            if os.path.exists(f"{pId}.txt"):
-                with open(f"{pId}.txt", "a") as file:
-                    log = (f"\n--- PRESCRIPTION ADDED ---\n"
-                           f"Doctor ID: {username}\n"
-                           f"Prescription: {prescriptionText}\n"
-                           f"Date & Time: {datetime.now().strftime('%d-%m-%Y %H:%M:%S')}\n")
-                    file.write(log)
+            if patientFileExists(pId):
+                log = (f"\n--- PRESCRIPTION ADDED ---\n"
+                       f"Doctor ID: {username}\n"
+                       f"Prescription: {prescriptionText}\n"
+                       f"Date & Time: {datetime.now().strftime('%d-%m-%Y %H:%M:%S')}")
+                writeToFile(patientFile(pId), log)
                 st.success("✅ Prescription added successfully 🎉")
                 if "prescribe_patient" in st.session_state:
                     st.session_state["menu"] = "View Appointments"
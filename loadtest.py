@@ -0,0 +1,258 @@
+# load test for LifeLine
+# builds a fake hospital, then runs many headless sessions (streamlit AppTest)
+# in worker processes doing what admins, doctors and patients normally do.
+# prints rerun latency per page, throughput, and checks the written files
+# for anything broken afterwards
+#
+# usage: python loadtest.py [--workers 4] [--sessions 10] [--patients 2000]
+#                           [--mix admin=1,doctor=2,patient=5] [--data DIR]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from multiprocessing import Pool
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+appFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hospital_v4.py")
+names = ["Raj", "Rajesh", "Anita", "Sunil", "Priya", "Amit", "Kiran", "Meena", "Arjun", "Neha"]
+diseases = ["Fever", "Cold", "Diabetes", "BP", "Heart Problem", "Asthma", "Infection", "Fracture"]
+doctorNames = {"General Physician": "Mehta", "Cardiologist": "Shah", "Orthopedic": "Rao"}
+
+
+# synthetic data in the same format the app writes
+def makeDataset(dataDir, patients):
+    os.makedirs(dataDir, exist_ok=True)
+    logins = []
+    with open(os.path.join(dataDir, "Doctors.txt"), "w") as file:
+        for spec, dname in doctorNames.items():
+            did = f"doc{dname[:3].lower()}45"
+            file.write(f"{did},{dname},{spec},Male,MBBS,10 yrs,9876500000\n")
+            logins.append(("doctor", did, did))
+    with open(os.path.join(dataDir, "Users.txt"), "w") as users:
+        for i in range(patients):
+            name = random.choice(names)
+            age = random.randint(1, 90)
+            pid = f"pat{name[:3].lower()}{age}_{i}"
+            passKey = f"{name}@{age}"
+            users.write(f"{pid},{passKey},{age},{name},98{random.randint(10000000, 99999999)}\n")
+            logins.append(("patient", pid, passKey))
+            with open(os.path.join(dataDir, f"{pid}.txt"), "w") as file:
+                file.write(
+                    f"Patient ID: {pid}\nName: {name}\nAge: {age}\nGender: Male\nBlood Group: O+\n"
+                    f"Contact: 9800000000\nAddress: Test Lane\nDiseases: {random.choice(diseases)}\n"
+                    f"Registration Time: 2026-01-01 10:00:00\n------------------------------\n"
+                    f"Registration fees: 1000  \n"
+                )
+    logins.append(("admin", "admin", "admin123"))
+    return logins
+
+
+def findButton(at, label):
+    for button in at.button:
+        if button.label.startswith(label):
+            return button
+    raise LookupError(f"no button {label!r}")
+
+
+def findWidget(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"no widget {label!r}")
+
+
+# one headless browser tab. every rerun is timed and tagged with its page
+class Session:
+    def __init__(self, samples):
+        self.at = AppTest.from_file(appFile, default_timeout=120)
+        self.samples = samples
+
+    def timed(self, page, action):
+        startTime = time.perf_counter()
+        try:
+            action()
+            ok = not self.at.exception
+        except Exception:
+            ok = False
+        self.samples.append((page, time.perf_counter() - startTime, ok))
+        return ok
+
+    def login(self, username, password):
+        self.at.run()
+        self.at.sidebar.text_input[0].set_value(username)
+        self.at.sidebar.text_input[1].set_value(password)
+        return self.timed("Login", lambda: findButton(self.at, "Login").click().run())
+
+    def open(self, menu):
+        return self.timed(menu, lambda: self.at.sidebar.selectbox[0].set_value(menu).run())
+
+
+def adminFlow(session):
+    for menu in ["View Patients", "Statistics", "Dues Report"]:
+        session.open(menu)
+
+
+def doctorFlow(session):
+    session.open("View Appointments")
+    if session.open("Add Prescription"):
+        at = session.at
+        picker = findWidget(at.selectbox, "Select Patient ID with Name")
+        picker.set_value(random.choice(picker.options))
+        findWidget(at.text_area, "Prescription Details").set_value("Paracetamol 500mg twice a day")
+        session.timed("Add Prescription (save)", lambda: findButton(at, "Add Prescription").click().run())
+
+
+def patientFlow(session):
+    at = session.at
+    if session.open("Book Appointment"):
+        findWidget(at.multiselect, "Select Symptoms/Disease").set_value(random.sample(diseases, 2))
+        at.run()
+        session.timed("Book Appointment (confirm)", lambda: findButton(at, "Confirm Booking").click().run())
+    if session.open("Discharge & Pay Bill") and any(b.label.startswith("Pay Rs.") for b in at.button):
+        findWidget(at.text_input, "Cardholder Name").set_value("Load Test")
+        findWidget(at.text_input, "Card Number").set_value("4111111111111111")
+        session.timed("Discharge & Pay Bill (pay)", lambda: findButton(at, "Pay Rs.").click().run())
+    session.open("Medical History")
+
+
+flows = {"admin": adminFlow, "doctor": doctorFlow, "patient": patientFlow}
+
+
+# runs in a worker process. returns every timed sample it collected
+def runWorker(job):
+    dataDir, logins, mix, sessions, seed = job
+    random.seed(seed)
+    os.chdir(dataDir)
+    samples = []
+    byRole = {role: [l for l in logins if l[0] == role] for role in flows}
+    roles = [role for role, weight in mix.items() for _ in range(weight) if byRole.get(role)]
+    for _ in range(sessions):
+        role = random.choice(roles)
+        _, username, password = random.choice(byRole[role])
+        session = Session(samples)
+        if session.login(username, password):
+            try:
+                flows[role](session)
+            except Exception:
+                samples.append((f"{role} flow", 0.0, False))
+    return samples
+
+
+# look through the written files for broken lines or cut-off log blocks,
+# and the change log for missing, repeated or damaged entries
+def checkCorruption(dataDir):
+    problems = []
+    blocks = {
+        "--- APPOINTMENT BOOKED ---": ["Diseases:", "Doctors:", "Date & Time:"],
+        "--- PRESCRIPTION ADDED ---": ["Doctor ID:", "Prescription:", "Date & Time:"],
+        "--- PAYMENT RECEIPT ---": ["Date:", "Method:", "PAYMENT MADE:", "Status:"],
+    }
+    with open(os.path.join(dataDir, "Users.txt"), "r") as file:
+        for n, line in enumerate(file, 1):
+            p = line.rstrip("\n").split(",")
+            if len(p) != 5 or not p[2].isdigit():
+                problems.append(f"Users.txt line {n}: {line.strip()!r}")
+    with open(os.path.join(dataDir, "Doctors.txt"), "r") as file:
+        for n, line in enumerate(file, 1):
+            if len(line.rstrip("\n").split(",")) != 7:
+                problems.append(f"Doctors.txt line {n}: {line.strip()!r}")
+    for fileName in os.listdir(dataDir):
+        if not fileName.startswith("pat") or not fileName.endswith(".txt"):
+            continue
+        with open(os.path.join(dataDir, fileName), "r") as file:
+            lines = [line.strip() for line in file]
+        if not lines or not lines[0].startswith("Patient ID:"):
+            problems.append(f"{fileName}: header missing")
+        for i, line in enumerate(lines):
+            for header, expected in blocks.items():
+                if line == header:
+                    got = lines[i + 1:i + 1 + len(expected)]
+                    if len(got) != len(expected) or not all(g.startswith(e) for g, e in zip(got, expected)):
+                        problems.append(f"{fileName} line {i + 1}: broken {header} block")
+    journal = os.path.join(dataDir, "state", "journal.log")
+    if os.path.exists(journal):
+        with open(journal, "r") as file:
+            for n, line in enumerate(file, 1):
+                try:
+                    json.loads(line)
+                except ValueError:
+                    problems.append(f"state/journal.log line {n}: not valid JSON")
+    changeLog = os.path.join(dataDir, "state", "changelog.log")
+    if os.path.exists(changeLog):
+        lastSeq = 0
+        with open(changeLog, "r") as file:
+            for n, line in enumerate(file, 1):
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError
+                    entry = json.loads(line)
+                    seq, data, crc = entry["seq"], entry["data"], entry["crc"]
+                except (ValueError, KeyError):
+                    problems.append(f"state/changelog.log line {n}: not a whole entry")
+                    continue
+                if seq != lastSeq + 1:
+                    problems.append(f"state/changelog.log line {n}: seq {seq} after {lastSeq}")
+                if zlib.crc32(data.encode()) != crc:
+                    problems.append(f"state/changelog.log line {n}: checksum mismatch in change {seq}")
+                lastSeq = seq
+    return problems
+
+
+def printReport(samples, elapsed):
+    pages = {}
+    for page, seconds, ok in samples:
+        pages.setdefault(page, []).append((seconds, ok))
+    print(f"{'page':32} {'runs':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for page in sorted(pages):
+        times = np.array([s for s, ok in pages[page]]) * 1000
+        errors = sum(1 for s, ok in pages[page] if not ok)
+        p50, p95, p99 = np.percentile(times, [50, 95, 99])
+        print(f"{page:32} {len(times):6d} {errors:6d} {p50:8.0f} {p95:8.0f} {p99:8.0f}")
+    print(f"\nreruns: {len(samples)} in {elapsed:.1f} s  ->  {len(samples) / elapsed:.1f} reruns/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LifeLine load test")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--sessions", type=int, default=10, help="sessions per worker")
+    parser.add_argument("--patients", type=int, default=2000, help="patients in the synthetic dataset")
+    parser.add_argument("--mix", default="admin=1,doctor=2,patient=5", help="role weights")
+    parser.add_argument("--data", default=None, help="data folder (default: new temp folder)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    mix = {}
+    for part in args.mix.split(","):
+        role, weight = part.split("=")
+        mix[role.strip()] = int(weight)
+
+    random.seed(args.seed)
+    dataDir = os.path.abspath(args.data or tempfile.mkdtemp(prefix="lifeline_load_"))
+    logins = makeDataset(dataDir, args.patients)
+    print(f"dataset: {args.patients} patients in {dataDir}")
+    print(f"running {args.workers} workers x {args.sessions} sessions, mix {mix}\n")
+
+    jobs = [(dataDir, logins, mix, args.sessions, args.seed + i) for i in range(args.workers)]
+    startTime = time.perf_counter()
+    with Pool(args.workers) as pool:
+        results = pool.map(runWorker, jobs)
+    elapsed = time.perf_counter() - startTime
+
+    printReport([s for samples in results for s in samples], elapsed)
+
+    problems = checkCorruption(dataDir)
+    print(f"\ndata check: {len(problems)} problem(s)")
+    for problem in problems[:20]:
+        print("  " + problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# warm standby for LifeLine
+# tails the change log written by hospital_v4.py and replays it into a
+# standby folder, so a failover only needs the standby folder and not a
+# full copy of the text files. progress is saved in the standby folder and
+# catch-up always continues from there. on an existing install, seed the
+# standby once with a copy of the data folder taken before the first logged
+# change; a fresh install can start from an empty standby
+#
+# usage: python replica.py [--log state/changelog.log] [--standby standby]
+#                          [--follow] [--interval 1]
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+stateFileName = ".replica_state.json"
+
+
+class ReplicationError(Exception):
+    pass
+
+
+# where the standby got to: last applied seq, byte offset in the log and
+# the primary time of that entry
+def loadState(standby):
+    try:
+        with open(os.path.join(standby, stateFileName), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {"seq": 0, "offset": 0, "time": 0}
+
+
+def saveState(standby, state):
+    state["checked"] = time.time()
+    fileName = os.path.join(standby, stateFileName)
+    with open(fileName + ".tmp", "w") as file:
+        json.dump(state, file)
+    os.replace(fileName + ".tmp", fileName)
+
+
+# log paths are relative to the primary folder. never write outside standby
+def standbyPath(standby, path):
+    target = os.path.abspath(os.path.join(standby, path))
+    if os.path.isabs(path) or not target.startswith(os.path.abspath(standby) + os.sep):
+        raise ReplicationError(f"refusing to write outside the standby folder: {path}")
+    return target
+
+
+# same as replaceRow in hospital_v4.py
+def replaceRow(fileName, key, newRow):
+    with open(fileName, "r") as file:
+        rows = [newRow if row.split(",", 1)[0].strip() == key else row for row in file]
+    with open(fileName + ".tmp", "w") as file:
+        file.writelines(rows)
+    os.replace(fileName + ".tmp", fileName)
+
+
+def applyEntry(standby, entry):
+    if zlib.crc32(entry["data"].encode()) != entry["crc"]:
+        raise ReplicationError(f"checksum mismatch in change {entry['seq']} ({entry['path']})")
+    target = standbyPath(standby, entry["path"])
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if entry["op"] == "append":
+        with open(target, "a") as file:
+            file.write(entry["data"])
+    elif entry["op"] == "replace":
+        with open(target + ".tmp", "w") as file:
+            file.write(entry["data"])
+        os.replace(target + ".tmp", target)
+    elif entry["op"] == "row":
+        if not os.path.exists(target):
+            raise ReplicationError(f"change {entry['seq']} updates a row of {entry['path']}, which the standby doesn't have")
+        replaceRow(target, entry["key"], entry["data"])
+    else:
+        raise ReplicationError(f"unknown operation {entry['op']!r} in change {entry['seq']}")
+
+
+# apply every whole entry after the saved offset. a half written last line
+# is left for the next pass, and so is a line that can't be read: the
+# primary cuts a broken tail off when it starts, so a later pass can carry
+# on from the same place. returns (applied, head seq seen, head time)
+def catchUp(logFile, standby, state):
+    state.pop("error", None)
+    state.pop("waiting", None)
+    applied = 0
+    headSeq = state["seq"]
+    headTime = state["time"]
+    with open(logFile, "rb") as log:
+        log.seek(state["offset"])
+        for line in log:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                state["waiting"] = f"unreadable entry after change {state['seq']} at byte {state['offset']}"
+                break
+            # a repeated or lower seq means two writers numbered the log on
+            # their own. that is as bad as a gap, never skip over it
+            if entry["seq"] != state["seq"] + 1:
+                kind = "gap in" if entry["seq"] > state["seq"] else "repeated seq in"
+                raise ReplicationError(f"{kind} change log: expected {state['seq'] + 1}, got {entry['seq']}")
+            applyEntry(standby, entry)
+            state["seq"] = entry["seq"]
+            state["time"] = entry["time"]
+            state["offset"] += len(line)
+            headSeq, headTime = entry["seq"], entry["time"]
+            applied += 1
+            # save progress now and then so a restart doesn't redo much
+            if applied % 500 == 0:
+                saveState(standby, state)
+    saveState(standby, state)
+    return applied, headSeq, headTime
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LifeLine standby replica")
+    parser.add_argument("--log", default=os.path.join("state", "changelog.log"), help="primary change log")
+    parser.add_argument("--standby", default="standby", help="standby data folder")
+    parser.add_argument("--follow", action="store_true", help="keep tailing the log")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls with --follow")
+    args = parser.parse_args()
+
+    os.makedirs(args.standby, exist_ok=True)
+    state = loadState(args.standby)
+    waiting = None
+    while True:
+        try:
+            startTime = time.perf_counter()
+            applied, seq, entryTime = catchUp(args.log, args.standby, state)
+        except FileNotFoundError:
+            # primary hasn't logged anything yet
+            applied, seq, entryTime = 0, state["seq"], state["time"]
+            saveState(args.standby, state)
+        except (ReplicationError, ValueError, KeyError) as e:
+            state["error"] = str(e)
+            saveState(args.standby, state)
+            print(f"replication stopped at change {state['seq']}: {e}", file=sys.stderr)
+            sys.exit(1)
+        if applied or not args.follow:
+            lag = time.time() - entryTime if entryTime else 0
+            print(f"applied {applied} change(s) in {(time.perf_counter() - startTime) * 1000:.0f} ms, "
+                  f"standby at change {seq}, newest change is {lag:.1f} s old")
+        # an unreadable entry is retried on the next pass instead of stopping
+        if state.get("waiting") and state["waiting"] != waiting:
+            print(f"waiting at change {state['seq']}: {state['waiting']}", file=sys.stderr)
+        waiting = state.get("waiting")
+        if not args.follow:
+            sys.exit(1 if waiting else 0)
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()